@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Offline benchmarks of full Perdidas grids.
+
+Generated liquicomun archives are served by a local stand-in of ESIOS and
+the results are written as JSON:
+
+    python -m benchmarks.run --repeat 5 --output results.json
+"""
+from __future__ import print_function
+
+from io import StringIO
+from timeit import default_timer
+
+import argparse
+import json
+import platform
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from liquicomun.formats import archive, write_audit, Component, PriceComposer, REEformat
+from liquicomun.formats.perdidas import Perdidas
+from liquicomun.formats.precios import Grcosdnc, Prgpncur, Prmdiari, Prmncur
+
+from specs.fixtures import FakeEsios, grid_zip, period_of
+
+# Normal month, 25 hours day and 23 hours day
+MONTHS = ('202111', '202110', '202203')
+
+
+class Environment(object):
+    """ Serves the archives through FakeEsios with an empty cache directory on every `reset` """
+    def __init__(self, months, latency=0.0):
+        self.original = (archive.Esios, REEformat._CACHE_DIR, REEformat.token, REEformat.snapshots)
+        self.directories = []
+        archive.Esios = FakeEsios
+        FakeEsios.archives = dict((month, [grid_zip(month)]) for month in months)
+        FakeEsios.latency = latency
+        REEformat.token = 'token'
+
+    def reset(self):
+        FakeEsios.calls = []
+        self.directories.append(tempfile.mkdtemp())
+        REEformat.set_cache_dir(self.directories[-1])
+
+    def close(self):
+        archive.Esios, cache_dir, REEformat.token, REEformat.snapshots = self.original
+        FakeEsios.latency = 0.0
+        REEformat.set_cache_dir(cache_dir)
+        for directory in self.directories:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def grid(month, type_import='perd_files', **params):
+    start, end = period_of(month)
+    return Perdidas(date_start=start, date_end=end, type_import=type_import, **params)
+
+
+def fetch_grid(month, type_import='perd_files', **params):
+    return [loss for loss in grid(month, type_import, **params) if loss is not None]
+
+
+def fetch_prices(month):
+    start, end = period_of(month)
+    return [cls(date_start=start, date_end=end) for cls in (Prmdiari, Prmncur, Prgpncur, Grcosdnc)]
+
+
+def compose_with_components(prices, losses):
+    energy = prices[0] + prices[1] + prices[2]
+    for loss in losses:
+        energy * (1 + loss / 100) + prices[3]
+    return len(losses)
+
+
+def measure(name, month, run, repeat, setup=None):
+    """
+    Times `run` `repeat` times calling `setup` (not timed) before every run
+
+    :param run: function that returns the number of processed items
+    """
+    timings = []
+    items = 0
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = default_timer()
+        items = run()
+        timings.append(default_timer() - start)
+    return {
+        'name': name,
+        'month': month,
+        'repeat': repeat,
+        'items': items,
+        'best': min(timings),
+        'mean': sum(timings) / len(timings),
+        'best_per_item': items and min(timings) / items,
+    }
+
+
+def arithmetic(losses):
+    total = 0.0
+    for loss in losses:
+        total += (loss * 2 + loss - 1).total_sum
+    return len(losses)
+
+
+def evaluate(losses):
+    total = 0.0
+    for loss in losses:
+        total += Component.evaluate('a * 2 + a - 1', a=loss).total_sum
+    return len(losses)
+
+
+def month_benchmarks(env, month, repeat, workers=None):
+    """ Yields the results of all the benchmarks of the month """
+    def cold():
+        env.reset()
+        REEformat.snapshots = True
+
+    def warm(snapshots=True, type_import='perd_files'):
+        def setup():
+            REEformat.snapshots = snapshots
+        env.reset()
+        REEformat.snapshots = snapshots
+        fetch_grid(month, type_import)
+        return setup
+
+    yield measure('cold_fetch', month, lambda: len(fetch_grid(month, workers=workers)), repeat, cold)
+    yield measure('warm_cache', month, lambda: len(fetch_grid(month)), repeat, warm())
+    yield measure('parse', month, lambda: len(fetch_grid(month)), repeat, warm(snapshots=False))
+    yield measure(
+        'k_coeffs_cold', month, lambda: len(fetch_grid(month, 'k_coeffs', workers=workers)), repeat, cold
+    )
+    yield measure(
+        'k_coeffs_parse', month, lambda: len(fetch_grid(month, 'k_coeffs')), repeat,
+        warm(snapshots=False, type_import='k_coeffs')
+    )
+    yield measure(
+        'k_coeffs_batch', month, lambda: grid(month, 'k_coeffs').batch()[1].shape[0], repeat,
+        warm(snapshots=False, type_import='k_coeffs')
+    )
+
+    yield measure('prices_parse', month, lambda: len(fetch_prices(month)), repeat, warm(snapshots=False))
+
+    prices = fetch_prices(month)
+    losses, stacked = grid(month, 'k_coeffs').batch()
+    losses = [loss for loss in losses if loss is not None]
+    yield measure('compose_components', month, lambda: compose_with_components(prices, losses), repeat)
+    yield measure(
+        'compose_engine', month,
+        lambda: PriceComposer(prices[:3], prices[3:]).compose_array(stacked).shape[0], repeat
+    )
+
+    REEformat.snapshots = True
+    for storage in ('list', 'numpy'):
+        losses = fetch_grid(month, storage=storage)
+        yield measure('arithmetic_' + storage, month, lambda: arithmetic(losses), repeat)
+        yield measure('evaluate_' + storage, month, lambda: evaluate(losses), repeat)
+        yield measure('audit_export_' + storage, month, lambda: write_audit(StringIO(), losses), repeat)
+
+
+def run(months=MONTHS, repeat=3, workers=None, latency=0.0):
+    """
+    Runs all the benchmarks
+
+    :return: JSON serializable dict with the environment and the results
+    """
+    env = Environment(months, latency)
+    try:
+        results = []
+        for month in months:
+            results.extend(month_benchmarks(env, month, repeat, workers))
+    finally:
+        env.close()
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'workers': workers,
+            'latency': latency,
+        },
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline liquicomun benchmarks')
+    parser.add_argument('--months', nargs='+', default=list(MONTHS), help='YYYYMM months to benchmark')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=None, help='threads of the cold fetches')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds of every fake ESIOS download')
+    parser.add_argument('--output', default=None, help='JSON file, stdout by default')
+    args = parser.parse_args(argv)
+
+    report = run(args.months, args.repeat, args.workers, args.latency)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,3 @@
 from .datetime import *
 from .formats import *
+from .store import ComponentStore
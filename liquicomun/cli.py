@@ -0,0 +1,143 @@
+"""
+liquicomun command line:
+
+    liquicomun prefetch --from 202101 --to 202512 --type k_coeffs --workers 4
+
+Prefetch downloads and parses the losses of every month, tariff and subsystem
+into the cache, so later runs only hit a warm cache.
+"""
+from __future__ import print_function
+
+import argparse
+import calendar
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from timeit import default_timer
+
+from .formats.perdidas import (
+    Perdidas, REE_subsystems_name, tariff_to_REEtariff, tariff_to_REEtariff_using_coeffs
+)
+from .formats.ree import REEformat
+
+
+def months_between(first, last):
+    """ ['YYYYMM', ...] from first to last (included) """
+    year, month = int(first[:4]), int(first[4:])
+    last_year, last_month = int(last[:4]), int(last[4:])
+    months = []
+    while (year, month) <= (last_year, last_month):
+        months.append('{:04d}{:02d}'.format(year, month))
+        year, month = year + month // 12, month % 12 + 1
+    return months
+
+
+def prefetch_month(month, tariffs=None, subsystems=None, type_import='perd_files', cache_dir=None, token=None):
+    """
+    Fetches and parses all the losses of the month into the cache
+
+    :return: summary dict of the month
+    """
+    if cache_dir:
+        REEformat.set_cache_dir(cache_dir)
+    if token:
+        REEformat.token = token
+    year, month_number = int(month[:4]), int(month[4:])
+    start = default_timer()
+    losses = Perdidas(
+        date_start='{}01'.format(month),
+        date_end='{}{:02d}'.format(month, calendar.monthrange(year, month_number)[1]),
+        tariffs=tariffs and list(tariffs), subsystems=subsystems and list(subsystems), type_import=type_import,
+    )
+    fetched = [loss for loss in losses]
+    available = [loss for loss in fetched if loss is not None]
+    counters = losses.metrics.as_dict()['counters']
+    return {
+        'month': month,
+        'losses': len(available),
+        'missing': len(fetched) - len(available),
+        'versions': sorted(set(loss.file_version for loss in available)),
+        'downloads': counters.get('downloads', 0),
+        'cache_hits': counters.get('cache_hits', 0),
+        'seconds': default_timer() - start,
+    }
+
+
+def summary_table(rows):
+    """ Text table of the prefetch summaries """
+    header = ('month', 'losses', 'missing', 'versions', 'downloads', 'cache hits', 'seconds')
+    lines = [header] + [
+        (
+            row['month'], str(row['losses']), str(row['missing']), ','.join(row['versions']) or '-',
+            str(row['downloads']), str(row['cache_hits']), '{:.2f}'.format(row['seconds']),
+        )
+        if 'error' not in row else (row['month'], '-', '-', 'error: {}'.format(row['error']), '-', '-', '-')
+        for row in rows
+    ]
+    widths = [max(len(line[column]) for line in lines) for column in range(len(header))]
+    return '\n'.join(
+        '  '.join(field.ljust(width) for field, width in zip(line, widths)).rstrip() for line in lines
+    )
+
+
+def prefetch(args):
+    months = months_between(args.first, args.last)
+    if not months:
+        print('No months between {} and {}'.format(args.first, args.last), file=sys.stderr)
+        return 2
+    params = {
+        'tariffs': args.tariffs,
+        'subsystems': args.subsystems,
+        'type_import': args.type_import,
+        'cache_dir': args.cache_dir,
+        'token': args.token,
+    }
+    rows = []
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [(month, executor.submit(prefetch_month, month, **params)) for month in months]
+        for month, future in futures:
+            try:
+                rows.append(future.result())
+            except Exception as e:
+                rows.append({'month': month, 'error': str(e) or e.__class__.__name__})
+            if args.verbose:
+                print(summary_table(rows[-1:]).splitlines()[-1], file=sys.stderr)
+    print(summary_table(rows))
+    # Failed months or losses not available
+    return 1 if any('error' in row or row['missing'] for row in rows) else 0
+
+
+def parser():
+    main_parser = argparse.ArgumentParser(prog='liquicomun', description='REE liquicomun files')
+    commands = main_parser.add_subparsers(dest='command')
+    commands.required = True
+
+    prefetch_parser = commands.add_parser('prefetch', help='fetch and parse the losses of many months into the cache')
+    prefetch_parser.add_argument('--from', dest='first', required=True, help='first month, YYYYMM')
+    prefetch_parser.add_argument('--to', dest='last', required=True, help='last month, YYYYMM')
+    # Checked before starting the pool, every worker would fail with the same error
+    prefetch_parser.add_argument(
+        '--tariffs', nargs='+', metavar='TARIFF', help='tariffs, all by default',
+        choices=sorted(set(tariff_to_REEtariff) | set(tariff_to_REEtariff_using_coeffs)),
+    )
+    prefetch_parser.add_argument(
+        '--subsystems', nargs='+', metavar='SUBSYSTEM', choices=sorted(REE_subsystems_name),
+        help='subsystems, all by default: %(choices)s',
+    )
+    prefetch_parser.add_argument(
+        '--type', dest='type_import', choices=('perd_files', 'k_coeffs'), default='perd_files'
+    )
+    prefetch_parser.add_argument('--workers', type=int, default=None, help='processes, one per CPU by default')
+    prefetch_parser.add_argument('--cache-dir', help='LIQUICOMUN_CACHE_DIR by default')
+    prefetch_parser.add_argument('--token', help='ESIOS token, ESIOS_TOKEN by default')
+    prefetch_parser.add_argument('-v', '--verbose', action='store_true', help='print every month when done')
+    prefetch_parser.set_defaults(func=prefetch)
+    return main_parser
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
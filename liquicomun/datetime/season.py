@@ -2,6 +2,9 @@
 from liquicomun.datetime import datetime
 from liquicomun.datetime.timezone import TIMEZONE
 import calendar
+import threading
+
+import numpy as np
 
 
 def get_season(dt):
@@ -16,6 +19,116 @@ def get_season(dt):
 def last_sunday(year, month):
     """Returns last sunday of month to determine dst change day
     """
-    for day in reversed(xrange(1, calendar.monthrange(year, month)[1] + 1)):
-        if calendar.weekday(year, month, day) == calendar.SUNDAY:
-            return day
+    last_day = calendar.monthrange(year, month)[1]
+    return last_day - (calendar.weekday(year, month, last_day) - calendar.SUNDAY) % 7
+
+
+class YearCalendar(object):
+    """
+    Hourly calendar of a year in the peninsular timezone, built once per year
+    (see `year_calendar`):
+
+    - dst_days: {3: day of the summer time change, 10: day of the winter time change}
+    - hours: hours of every day of the year (23, 24 or 25)
+    - summer: days x 25 hourly slots, True if the hour is in summer time.
+      Hour 1 is the one from 00:00 to 01:00, slots after the last hour of the day are False
+    """
+    def __init__(self, year):
+        self.year = year
+        self.dst_days = {3: last_sunday(year, 3), 10: last_sunday(year, 10)}
+        first = np.datetime64('{:04d}-01-01'.format(year), 'D')
+        self.start = first
+        self.num_days = 366 if calendar.isleap(year) else 365
+
+        spring = self.day_of_year(3, self.dst_days[3])
+        autumn = self.day_of_year(10, self.dst_days[10])
+        hours = np.full(self.num_days, 24, dtype=np.int8)
+        hours[spring] = 23
+        hours[autumn] = 25
+        hours.setflags(write=False)
+        self.hours = hours
+
+        summer = np.zeros((self.num_days, 25), dtype=bool)
+        summer[spring + 1:autumn, :24] = True
+        # 02:00 is 03:00 in the change to summer time
+        summer[spring, 2:23] = True
+        # 02:00 to 03:00 happens twice in the change to winter time
+        summer[autumn, :3] = True
+        summer.setflags(write=False)
+        self.summer = summer
+
+    def day_of_year(self, month, day):
+        """ Position of the day in the year arrays """
+        return (np.datetime64('{:04d}-{:02d}-{:02d}'.format(self.year, month, day), 'D') - self.start).astype(int)
+
+    def month_slice(self, month):
+        first = self.day_of_year(month, 1)
+        return slice(first, first + calendar.monthrange(self.year, month)[1])
+
+    def month_hours(self, month):
+        """ Hours of every day of the month """
+        return self.hours[self.month_slice(month)]
+
+    def month_summer(self, month):
+        """ days x 25 summer time slots of the month """
+        return self.summer[self.month_slice(month)]
+
+    def dst_changes(self, utc=False):
+        """
+        Instants of the changes to summer and winter time as datetime64[s]
+
+        :param utc: UTC instants instead of local (naive) ones
+        """
+        changes = []
+        for month in (3, 10):
+            change = np.datetime64(
+                '{:04d}-{:02d}-{:02d}T02:00:00'.format(self.year, month, self.dst_days[month]), 's'
+            )
+            if utc:
+                change -= np.timedelta64(1, 'h')
+            changes.append(change)
+        return tuple(changes)
+
+
+_YEAR_CALENDARS = {}
+_YEAR_CALENDARS_LOCK = threading.Lock()
+
+
+def year_calendar(year):
+    """ Returns the cached YearCalendar of the year """
+    result = _YEAR_CALENDARS.get(year)
+    if result is None:
+        with _YEAR_CALENDARS_LOCK:
+            result = _YEAR_CALENDARS.get(year)
+            if result is None:
+                result = _YEAR_CALENDARS[year] = YearCalendar(year)
+    return result
+
+
+def is_summer(timestamps, utc=False):
+    """
+    Vectorized summer time check
+
+    :param timestamps: naive local datetimes or datetime64 values (UTC ones if `utc`)
+    :return: bool array, ambiguous local times are winter time as in get_season
+    """
+    values = np.asarray(timestamps, dtype='datetime64[s]')
+    years = values.astype('datetime64[Y]').astype(int) + 1970
+    if not years.size:
+        return np.zeros(values.shape, dtype=bool)
+    first_year = int(years.min())
+    changes = np.array(
+        [year_calendar(year).dst_changes(utc) for year in range(first_year, int(years.max()) + 1)]
+    )
+    position = years - first_year
+    return (values >= changes[position, 0]) & (values < changes[position, 1])
+
+
+def get_seasons(timestamps, utc=False):
+    """
+    Vectorized get_season
+
+    :param timestamps: naive local datetimes or datetime64 values (UTC ones if `utc`)
+    :return: array of 'summer' and 'winter'
+    """
+    return np.where(is_summer(timestamps, utc), 'summer', 'winter')
@@ -2,3 +2,7 @@ from .component import Component
 from .perdidas import *
 from .precios import *
 from .ree import REEformat
+from .audit import write_audit
+from .composition import PriceComposer
+from .refresh import refresh_versions, VersionChange
+from .client import EsiosClient
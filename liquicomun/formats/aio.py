@@ -0,0 +1,74 @@
+"""
+asyncio interface for the REE formats (python 3.7+)
+
+The ESIOS client, the unzip and the parse are blocking, so they are run in
+threads of the event loop executor (the default one unless an executor is
+passed): the I/O is not asynchronous and the concurrency is bounded by the
+executor workers
+"""
+import asyncio
+import collections
+import functools
+
+# Default limit of concurrent fetches of an async Perdidas iteration
+DEFAULT_WORKERS = 4
+
+
+async def fetch(cls, *args, **kwargs):
+    """
+    Builds an instance of cls without blocking the event loop
+
+    :param executor: optional concurrent.futures executor, loop default if not provided
+    """
+    executor = kwargs.pop('executor', None)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(cls, *args, **kwargs))
+
+
+class PerdidasAsyncIterator(object):
+    """
+    Asynchronous iterator over the losses of a Perdidas grid.
+
+    All the losses are scheduled at the first iteration, no more than `workers`
+    months at the same time, and returned in the Perdidas iteration order
+    """
+    def __init__(self, losses, workers=None, executor=None):
+        self.losses = losses
+        self.workers = workers or losses.workers or DEFAULT_WORKERS
+        self.executor = executor
+        self.tasks = None
+        self.semaphore = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.tasks is None:
+            self.semaphore = asyncio.Semaphore(self.workers)
+            self.tasks = collections.deque(
+                asyncio.ensure_future(self._fetch(subsystem, tariff))
+                for subsystem, tariff in self.losses.grid
+            )
+        if not self.tasks:
+            raise StopAsyncIteration
+        return await self.tasks.popleft()
+
+    async def _fetch(self, subsystem, tariff):
+        losses = await asyncio.gather(*[
+            self._fetch_period(subsystem, tariff, *period) for period in self.losses.periods
+        ])
+        return self.losses._join_months(subsystem, tariff, list(losses))
+
+    async def _fetch_period(self, subsystem, tariff, date_start, date_end):
+        loop = asyncio.get_running_loop()
+        async with self.semaphore:
+            return await loop.run_in_executor(
+                self.executor, self.losses._fetch_month, subsystem, tariff, date_start, date_end
+            )
+
+
+async def fetch_all(losses, workers=None, executor=None):
+    """
+    Returns the list of losses of all the Perdidas grid, None for the not available ones
+    """
+    return [a_loss async for a_loss in PerdidasAsyncIterator(losses, workers=workers, executor=executor)]
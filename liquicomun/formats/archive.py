@@ -0,0 +1,243 @@
+import os
+import shutil
+import zipfile
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from io import TextIOWrapper
+
+from esios import Esios
+
+from .cache import END_OF_VERSIONS
+from liquicomun import metrics
+
+
+class VersionNotAvailable(ValueError):
+    """ ESIOS has no archive for the requested `next` offset """
+
+
+class LiquicomunArchive(object):
+    """
+    Liquicomun ZIP stored on disk with an index of its members.
+
+    All the perd, Kreal, petar, prm*, ... files of a period are served from it
+    """
+    def __init__(self, path):
+        self.path = path
+        with zipfile.ZipFile(path) as zf:
+            self.members = zf.namelist()
+        self.index = set(self.members)
+        self.version = self.members[0][:2]
+
+    def __contains__(self, member):
+        return member in self.index
+
+    @contextmanager
+    def open(self, member):
+        """ Opens the member as a text stream """
+        with zipfile.ZipFile(self.path) as zf:
+            with zf.open(member, "r") as fdata:
+                yield TextIOWrapper(fdata)
+
+    def extractall(self, path):
+        with zipfile.ZipFile(self.path) as zf:
+            zf.extractall(path)
+
+
+class ArchiveCache(object):
+    """
+    Cache of liquicomun archives keyed by (date range, version).
+
+    Every archive is downloaded once and stored as
+    <directory>/<version>_liquicomun_<start>_<end>.zip
+    The `next` offsets requested to ESIOS are recorded in the version
+    manifest of the store (or remembered by the process without a store) to
+    avoid downloading the same archive again.
+
+    It is thread safe: concurrent fetches of the same offset wait for a single
+    download and no more than `max_requests` ESIOS requests are in flight.
+    """
+    file_tmpl = '{version}_liquicomun_{start}_{end}.zip'
+
+    def __init__(self, directory, store=None, max_requests=4, extract_dir=None):
+        """
+        :param extract_dir: directory where all the members of every downloaded archive are
+            extracted, just once. Members are read from the archives, so they are not extracted by default
+        """
+        self.directory = directory
+        self.extract_dir = extract_dir
+        # CacheStore where the members of the downloaded archives are indexed
+        self.store = store
+        self.archives = {}
+        # (start, end, next) -> (version, fetch time)
+        self.offsets = {}
+        self.lock = threading.RLock()
+        # (start, end, next) -> lock held while downloading it
+        self.downloading = {}
+        self.requests = threading.BoundedSemaphore(max_requests)
+        self.extracting = threading.Lock()
+
+    def set_max_requests(self, max_requests):
+        """ Sets the limit of concurrent ESIOS requests """
+        self.requests = threading.BoundedSemaphore(max_requests)
+
+    def path(self, start, end, version):
+        return os.path.join(self.directory, self.file_tmpl.format(version=version, start=start, end=end))
+
+    def get(self, start, end, version):
+        """ Returns the stored archive of this version or None """
+        key = (start, end, version)
+        with self.lock:
+            archive = self.archives.get(key)
+            if archive is not None and not os.path.isfile(archive.path):
+                # Removed from the cache
+                del self.archives[key]
+                archive = None
+            if archive is None:
+                path = self.path(start, end, version)
+                if not os.path.isfile(path):
+                    return None
+                archive = LiquicomunArchive(path)
+                self.archives[key] = archive
+            return archive
+
+    def fetch(self, token, start_date, end_date, next=0, version=None, client=None):
+        """
+        Returns the archive that ESIOS serves for the `next` offset, downloading it only the first time
+
+        :param start_date: datetime
+        :param end_date: datetime
+        :param version: version known to be served for this offset, if any
+        :param client: ESIOS client (see EsiosClient), a new Esios(token) by default
+        :return: LiquicomunArchive or None if no data is available
+        :raises VersionNotAvailable: no more versions are available from this offset
+        """
+        start = start_date.strftime('%Y%m%d')
+        end = end_date.strftime('%Y%m%d')
+        key = (start, end, next)
+        requested = time.time()
+        with self.lock:
+            download_lock = self.downloading.setdefault(key, threading.Lock())
+
+        with download_lock:
+            with self.lock:
+                known = self.offsets.get(key)
+                # Without a store all the offsets of this process are trusted,
+                # with a store just the ones downloaded while waiting for the lock
+                if version is None and known and (self.store is None or known[1] >= requested):
+                    version = known[0]
+                if version:
+                    archive = self.get(start, end, version)
+                    if archive is not None:
+                        self.offsets[key] = (version, time.time())
+                        return archive
+
+            if not os.path.isdir(self.directory):
+                try:
+                    os.makedirs(self.directory)
+                except OSError:
+                    # Created meanwhile by another thread
+                    pass
+            tmp_path = self.path(start, end, 'tmp{}.{}'.format(os.getpid(), threading.current_thread().ident))
+            with self.requests:
+                metrics.count('probes')
+                e = client or Esios(token)
+                try:
+                    with metrics.timer('download'):
+                        size = self._download(e, start_date, end_date, next, tmp_path)
+                except Exception as e:
+                    if os.path.isfile(tmp_path):
+                        os.unlink(tmp_path)
+                    if not isinstance(e, AssertionError):
+                        raise
+                    if self.store is not None:
+                        self.store.record_version('_'.join([start, end]), next, END_OF_VERSIONS)
+                    raise VersionNotAvailable(str(e))
+            if not size:
+                os.unlink(tmp_path)
+                logging.debug("No valid data has been downloaded")
+                return None
+            metrics.count('downloads')
+
+            with metrics.timer('unzip'):
+                return self._store(key, tmp_path)
+
+    @staticmethod
+    def _download(esios, start_date, end_date, next, path):
+        """
+        Downloads the archive to path, streaming it if the client supports it
+
+        :return: downloaded bytes
+        """
+        liquicomun = esios.liquicomun()
+        with open(path, 'wb') as zfile:
+            if hasattr(liquicomun, 'download_to'):
+                return liquicomun.download_to(start_date, end_date, zfile, next=next)
+            zdata = liquicomun.download(start_date, end_date, next=next)
+            if zdata:
+                zfile.write(zdata)
+            return zdata and len(zdata) or 0
+
+    def _store(self, key, tmp_path):
+        """ Stores the downloaded archive and indexes its members """
+        start, end, next = key
+        try:
+            version = LiquicomunArchive(tmp_path).version
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        path = self.path(start, end, version)
+        os.rename(tmp_path, path)
+        archive = LiquicomunArchive(path)
+        if self.extract_dir:
+            self.extract(archive)
+        if self.store is not None:
+            self.store.put_archive(archive)
+            self.store.record_version('_'.join([start, end]), next, version)
+        with self.lock:
+            self.archives[(start, end, version)] = archive
+            self.offsets[key] = (version, time.time())
+        return archive
+
+    def extract(self, archive):
+        """
+        Extracts all the members of the archive to <extract_dir>/<archive name>, just once
+
+        :return: directory with the extracted members
+        """
+        name = os.path.splitext(os.path.basename(archive.path))[0]
+        directory = os.path.join(self.extract_dir or os.path.join(self.directory, 'extracted'), name)
+        with self.extracting:
+            if not os.path.isdir(directory):
+                tmp_directory = '{}.{}.{}.tmp'.format(directory, os.getpid(), threading.current_thread().ident)
+                archive.extractall(tmp_directory)
+                try:
+                    os.rename(tmp_directory, directory)
+                except OSError:
+                    # Extracted meanwhile by another process
+                    shutil.rmtree(tmp_directory)
+                    if not os.path.isdir(directory):
+                        raise
+        return directory
+
+    def clear(self, version=''):
+        """
+        Removes the stored archives
+        :param version: Cn or An prefix. All if empty
+        """
+        with self.lock:
+            for key in list(self.archives):
+                if not version or key[2] == version:
+                    del self.archives[key]
+            for key, (offset_version, _) in list(self.offsets.items()):
+                if not version or offset_version == version:
+                    del self.offsets[key]
+            if not os.path.isdir(self.directory):
+                return
+            for file_name in os.listdir(self.directory):
+                # tmp<pid>.<thread> files are downloads in progress
+                if file_name.startswith('tmp'):
+                    continue
+                if file_name.endswith('.zip') and file_name.startswith(version):
+                    os.unlink(os.path.join(self.directory, file_name))
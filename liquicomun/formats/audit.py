@@ -0,0 +1,65 @@
+"""
+Streaming export of the audit data of many components.
+
+Rows are written chunk by chunk from the columnar audit data, the whole
+audit trail is never built in memory.
+"""
+import csv
+
+from .component import audit_labels
+
+FORMATS = ('csv', 'copy')
+
+
+def _copy_field(value):
+    """ Formats a field in the PostgreSQL COPY text format """
+    if value is None:
+        return '\\N'
+    if isinstance(value, float):
+        return repr(value)
+    return '{}'.format(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def iter_audit_rows(components, start=False, end=False, chunk_days=7, key=None):
+    """
+    Yields the lists of audit rows of the components, one list per chunk of `chunk_days` days.
+    None components (not available losses) are skipped
+
+    :param key: function that returns the leading columns of the rows of a component
+    """
+    for component in components:
+        if component is None:
+            continue
+        prefix = key and list(key(component)) or []
+        for columns in component.iter_audit_columns(start, end, chunk_days):
+            labels = audit_labels(columns).tolist()
+            values = columns.values.tolist()
+            yield [prefix + [label, value, columns.version, ''] for label, value in zip(labels, values)]
+
+
+def write_audit(out, components, format='csv', start=False, end=False, chunk_days=7, key=None,
+                delimiter=','):
+    """
+    Writes the audit data of the components to the text stream
+
+    :param format: 'csv' or 'copy' (text format of PostgreSQL COPY ... FROM STDIN)
+    :param start: start_day of every component (included)
+    :param end: end_day of every component (included)
+    :param key: function that returns the leading columns of the rows of a component
+    :param delimiter: csv delimiter, the COPY one is always a tab
+    :return: number of written rows
+    """
+    if format not in FORMATS:
+        raise ValueError('Invalid audit format %s' % format)
+    count = 0
+    writer = format == 'csv' and csv.writer(out, delimiter=delimiter, lineterminator='\n')
+    for rows in iter_audit_rows(components, start, end, chunk_days, key):
+        if writer:
+            writer.writerows(rows)
+        else:
+            out.write(''.join(
+                '\t'.join(_copy_field(field) for field in row) + '\n'
+                for row in rows
+            ))
+        count += len(rows)
+    return count
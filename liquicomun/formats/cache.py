@@ -0,0 +1,268 @@
+import os
+import time
+import sqlite3
+import zipfile
+import threading
+from collections import namedtuple
+from contextlib import closing, contextmanager
+from io import TextIOWrapper
+
+
+CacheEntry = namedtuple('CacheEntry', [
+    'file_tmpl', 'subsystem', 'period', 'version', 'filename', 'origin', 'size', 'fetched_at', 'path', 'member',
+])
+CacheEntry.__doc__ = """
+Cached REE file. `path` is the file on disk or, if `member` is set, the archive that contains it
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    file_tmpl TEXT NOT NULL,
+    subsystem TEXT NOT NULL,
+    period TEXT NOT NULL,
+    version TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    origin TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    path TEXT NOT NULL,
+    member TEXT,
+    PRIMARY KEY (period, file_tmpl, version)
+);
+CREATE INDEX IF NOT EXISTS files_version ON files (version);
+CREATE TABLE IF NOT EXISTS versions (
+    period TEXT NOT NULL,
+    next INTEGER NOT NULL,
+    version TEXT NOT NULL,
+    checked_at REAL NOT NULL,
+    PRIMARY KEY (period, next)
+);
+"""
+
+# Version of the `next` offset where the list of available versions ends
+END_OF_VERSIONS = ''
+
+
+def split_filename(filename):
+    """
+    Splits a REE file name as <version>_<file_tmpl>_<start>_<end>
+
+    :return: (file_tmpl, subsystem, period, version)
+    """
+    version = filename[:2]
+    period = filename[-17:]
+    file_tmpl = filename[3:-18]
+    subsystem = ''
+    if '_' in file_tmpl:
+        subsystem = file_tmpl.split('_')[-1]
+    return file_tmpl, subsystem, period, version
+
+
+class CacheStore(object):
+    """
+    Persistent cache of REE files.
+
+    A SQLite index keyed by (file template, subsystem, period, version)
+    records origin, size and fetch time of every file. Contents are kept
+    inside the downloaded liquicomun archives.
+    Binary snapshots of the components parsed from them are kept in the
+    `snapshots` directory.
+    """
+    index_name = 'index.sqlite'
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.snapshot_dir = os.path.join(directory, 'snapshots')
+        self.index_path = os.path.join(directory, self.index_name)
+        self._ready = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def _connect(self):
+        """ Yields the SQLite connection of the current thread and process """
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    for directory in (self.directory, self.snapshot_dir):
+                        if not os.path.isdir(directory):
+                            try:
+                                os.makedirs(directory)
+                            except OSError:
+                                # Created meanwhile by another process
+                                pass
+                    with closing(sqlite3.connect(self.index_path, timeout=30)) as conn:
+                        conn.executescript(SCHEMA)
+                    self._ready = True
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.conn = sqlite3.connect(self.index_path, timeout=30)
+            local.pid = os.getpid()
+        yield local.conn
+
+    def put_archive(self, archive, origin='server'):
+        """
+        Indexes all the members of a downloaded liquicomun archive
+        """
+        with self._connect() as conn:
+            with conn:
+                with zipfile.ZipFile(archive.path) as zf:
+                    for info in zf.infolist():
+                        self._insert(conn, info.filename, origin, info.file_size, archive.path, info.filename)
+
+    def _insert(self, conn, filename, origin, size, path, member=None):
+        file_tmpl, subsystem, period, version = split_filename(filename)
+        conn.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (file_tmpl, subsystem, period, version, filename, origin, size, time.time(), path, member)
+        )
+
+    def get(self, filename):
+        """ Returns the entry of this exact file or None """
+        file_tmpl, subsystem, period, version = split_filename(filename)
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM files WHERE period = ? AND file_tmpl = ? AND version = ?",
+                (period, file_tmpl, version)
+            ).fetchone()
+        return row and CacheEntry(*row)
+
+    def lookup(self, filenames, no_cache=(), timeout=0):
+        """
+        Returns the entry of the first available file with a single indexed query.
+
+        :param filenames: candidate file names of the same period, by priority
+        :param no_cache: versions only valid `timeout` seconds after being fetched
+        :return: CacheEntry or None
+        """
+        if not filenames:
+            return None
+        keys = [split_filename(filename) for filename in filenames]
+        file_tmpls = sorted(set(key[0] for key in keys))
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM files WHERE period = ? AND file_tmpl IN ({})".format(
+                    ', '.join('?' * len(file_tmpls))
+                ),
+                [keys[0][2]] + file_tmpls
+            ).fetchall()
+        entries = dict((row[4], CacheEntry(*row)) for row in rows)
+        now = time.time()
+        for filename in filenames:
+            entry = entries.get(filename)
+            if entry is None:
+                continue
+            if entry.version in no_cache and now - entry.fetched_at >= timeout:
+                continue
+            return entry
+        return None
+
+    def entries(self, file_tmpl=None, subsystem=None, period=None, version=None):
+        """
+        Lists the cached entries matching the passed filters
+        """
+        where, params = self._filters(file_tmpl, subsystem, period, version)
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM files{} ORDER BY period, file_tmpl, version".format(where), params
+            ).fetchall()
+        return [CacheEntry(*row) for row in rows]
+
+    def invalidate(self, file_tmpl=None, subsystem=None, period=None, version=None):
+        """
+        Removes the cached entries matching the passed filters, all of them if no filter is passed.
+
+        Files (and archives) not referenced anymore are removed from disk
+        :return: number of removed entries
+        """
+        where, params = self._filters(file_tmpl, subsystem, period, version)
+        with self._connect() as conn:
+            with conn:
+                rows = conn.execute("SELECT filename, path FROM files{}".format(where), params).fetchall()
+                count = conn.execute("DELETE FROM files{}".format(where), params).rowcount
+                for path in set(row[1] for row in rows):
+                    used = conn.execute("SELECT 1 FROM files WHERE path = ? LIMIT 1", (path,)).fetchone()
+                    if not used and os.path.isfile(path):
+                        os.unlink(path)
+        self._remove_snapshots(set(row[0] for row in rows))
+        return count
+
+    def snapshot_path(self, filename, variant=''):
+        """
+        Path of the snapshot of a component parsed from the cached file
+
+        :param variant: distinguishes components parsed from the same file (i.e. the tariff)
+        """
+        name = variant and '{}.{}'.format(filename, variant) or filename
+        return os.path.join(self.snapshot_dir, name + '.lqc')
+
+    def _remove_snapshots(self, filenames):
+        if not filenames or not os.path.isdir(self.snapshot_dir):
+            return
+        for name in os.listdir(self.snapshot_dir):
+            if name.split('.')[0] in filenames:
+                os.unlink(os.path.join(self.snapshot_dir, name))
+
+    def record_version(self, period, next, version):
+        """
+        Records the version that ESIOS serves for the `next` offset of the period.
+
+        :param version: END_OF_VERSIONS if the offset is not available
+        """
+        with self._connect() as conn:
+            with conn:
+                if version != END_OF_VERSIONS:
+                    # Offsets move when new versions are published
+                    conn.execute(
+                        "DELETE FROM versions WHERE period = ? AND version = ? AND next != ?",
+                        (period, version, next)
+                    )
+                conn.execute(
+                    "INSERT OR REPLACE INTO versions VALUES (?, ?, ?, ?)",
+                    (period, next, version, time.time())
+                )
+
+    def versions(self, period):
+        """
+        Returns the version manifest of the period
+
+        :return: {next: (version, checked_at)}
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT next, version, checked_at FROM versions WHERE period = ?", (period,)
+            ).fetchall()
+        return dict((row[0], (row[1], row[2])) for row in rows)
+
+    def forget_versions(self, period=None, version=None):
+        """
+        Removes the version manifest entries matching the passed filters
+        """
+        where, params = self._filters(None, None, period, version)
+        with self._connect() as conn:
+            with conn:
+                conn.execute("DELETE FROM versions{}".format(where), params)
+
+    @staticmethod
+    def _filters(file_tmpl, subsystem, period, version):
+        conditions = []
+        params = []
+        for column, value in (('file_tmpl', file_tmpl), ('subsystem', subsystem),
+                              ('period', period), ('version', version)):
+            if value is not None:
+                conditions.append('{} = ?'.format(column))
+                params.append(value)
+        where = conditions and ' WHERE ' + ' AND '.join(conditions) or ''
+        return where, params
+
+    @staticmethod
+    @contextmanager
+    def open(entry):
+        """ Opens the cached file as a text stream """
+        if entry.member:
+            with zipfile.ZipFile(entry.path) as zf:
+                with zf.open(entry.member, "r") as fdata:
+                    yield TextIOWrapper(fdata)
+        else:
+            with open(entry.path, 'r') as csvfile:
+                yield csvfile
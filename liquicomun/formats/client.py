@@ -0,0 +1,199 @@
+import os
+import time
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from esios.archives import LIQUICOMUN_PRIORITY
+
+
+class EsiosError(IOError):
+    """ ESIOS could not be reached after all the retries """
+
+
+class DeadlineExceeded(EsiosError):
+    """ The fetch did not finish before its deadline """
+
+
+class ArchiveNotFound(ValueError):
+    """ ESIOS does not serve the requested archive (HTTP 404), other versions may be available """
+
+
+class EsiosClient(object):
+    """
+    Shared ESIOS client to download the liquicomun archives.
+
+    All the requests go through a pooled keep-alive HTTP session with
+    per request timeouts and bounded retries with exponential backoff.
+    Every download must finish before its deadline. The list of archives
+    of a period is reused for `listing_ttl` seconds, so probing many `next`
+    offsets lists them once.
+
+    It serves the subset of the esios API used by liquicomun:
+    `client.liquicomun().download(start_date, end_date, next=n)`
+    """
+    apiroot = 'https://api.esios.ree.es'
+    # Transient errors worth a retry
+    retry_statuses = (429, 500, 502, 503, 504)
+    # Not published (yet), the next versions are probed
+    not_found_statuses = (404, )
+    # Bytes read at once when streaming the archives
+    chunk_size = 1 << 16
+
+    def __init__(self, token=None, timeout=(10, 120), retries=3, backoff=0.5, deadline=600, pool_size=10,
+                 listing_ttl=60, session=None):
+        """
+        :param token: ESIOS token, ESIOS_TOKEN environment variable by default
+        :param timeout: seconds of every request, a (connect, read) tuple or a number
+        :param retries: retries of every request after a transient error
+        :param backoff: seconds before the first retry, doubled on every retry
+        :param deadline: seconds of a whole download (list and archive, retries included)
+        :param pool_size: kept alive connections
+        :param session: requests.Session to use instead of a new one
+        """
+        self.token = token or os.getenv('ESIOS_TOKEN')
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.deadline = deadline
+        self.listing_ttl = listing_ttl
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
+        self.lock = threading.Lock()
+        # (start, end) -> (archives by priority, listed at)
+        self.listings = {}
+
+    def liquicomun(self):
+        return self
+
+    @property
+    def headers(self):
+        return {
+            'Accept': 'application/json; application/vnd.esios-api-v2+json',
+            'Authorization': 'Token token="{0}"'.format(self.token),
+            'x-api-key': self.token,
+            'User-Agent': 'esios',
+        }
+
+    def request(self, url, params=None, deadline=None, stream=False):
+        """
+        GETs the url retrying the transient errors
+
+        :param deadline: time.time() limit of the request and its retries
+        :param stream: do not read the response content
+        :return: requests.Response
+        """
+        attempt = 0
+        while True:
+            timeout = self.timeout
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise DeadlineExceeded('Deadline exceeded requesting {}'.format(url))
+                if isinstance(timeout, tuple):
+                    timeout = tuple(min(value, remaining) for value in timeout)
+                else:
+                    timeout = min(timeout, remaining)
+            try:
+                response = self.session.get(
+                    url, params=params, headers=self.headers, timeout=timeout, stream=stream
+                )
+                if response.status_code in self.not_found_statuses:
+                    raise ArchiveNotFound('HTTP {} requesting {}'.format(response.status_code, url))
+                if response.status_code not in self.retry_statuses:
+                    response.raise_for_status()
+                    return response
+                error = 'HTTP {}'.format(response.status_code)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = str(e)
+            except requests.HTTPError as e:
+                raise EsiosError(str(e))
+
+            if attempt >= self.retries:
+                raise EsiosError('Requesting {} failed after {} retries: {}'.format(url, attempt, error))
+            wait = self.backoff * 2 ** attempt
+            if deadline is not None and time.time() + wait >= deadline:
+                raise DeadlineExceeded('Deadline exceeded requesting {}: {}'.format(url, error))
+            logging.debug('Retrying %s in %s seconds: %s', url, wait, error)
+            time.sleep(wait)
+            attempt += 1
+
+    def archives(self, start_date, end_date, deadline=None):
+        """
+        Returns the liquicomun archives of the period by priority, as listed by ESIOS
+        """
+        key = (start_date.isoformat(), end_date.isoformat())
+        with self.lock:
+            listing = self.listings.get(key)
+        if listing is not None and time.time() - listing[1] < self.listing_ttl:
+            return listing[0]
+        params = {
+            'locale': 'es',
+            'start_date': key[0],
+            'end_date': key[1],
+            'date_type': 'datos',
+            'taxonomy_terms[]': 'Settlements',
+        }
+        body = self.request('{}/archives'.format(self.apiroot), params, deadline).json()
+        archives = sorted(
+            [archive for archive in body['archives'] if 'liquicomun' in archive['name']],
+            key=lambda archive: LIQUICOMUN_PRIORITY.index(archive['name'][:2])
+        )
+        with self.lock:
+            self.listings[key] = (archives, time.time())
+        return archives
+
+    def url(self, start_date, end_date, next=0, deadline=None):
+        """
+        Returns the download url of the liquicomun archive of the `next` best available version
+
+        :raises AssertionError: the version is not available, as esios does
+        """
+        archives = self.archives(start_date, end_date, deadline)
+        if next >= len(archives):
+            raise AssertionError("The desired version (next +{}) is not available. Available versions '{}'".format(
+                next, ', '.join(archive['name'][:2] for archive in archives)
+            ))
+        return self.apiroot + archives[next]['download']['url']
+
+    def download(self, start_date, end_date, next=0):
+        """
+        Downloads the liquicomun archive of the `next` best available version
+
+        :return: archive content as bytes
+        :raises AssertionError: the version is not available, as esios does
+        :raises ArchiveNotFound: the archive of the version is not served
+        :raises EsiosError: ESIOS could not be reached
+        """
+        deadline = time.time() + self.deadline if self.deadline else None
+        return self.request(self.url(start_date, end_date, next, deadline), deadline=deadline).content
+
+    def download_to(self, start_date, end_date, fileobj, next=0):
+        """
+        Streams the liquicomun archive of the `next` best available version to the binary file
+
+        :return: written bytes
+        :raises AssertionError: the version is not available, as esios does
+        :raises ArchiveNotFound: the archive of the version is not served
+        :raises EsiosError: ESIOS could not be reached
+        """
+        deadline = time.time() + self.deadline if self.deadline else None
+        response = self.request(self.url(start_date, end_date, next, deadline), deadline=deadline, stream=True)
+        size = 0
+        try:
+            for chunk in response.iter_content(self.chunk_size):
+                if deadline is not None and time.time() > deadline:
+                    raise DeadlineExceeded('Deadline exceeded downloading the liquicomun archive')
+                fileobj.write(chunk)
+                size += len(chunk)
+        except requests.RequestException as e:
+            raise EsiosError(str(e))
+        finally:
+            response.close()
+        return size
@@ -1,26 +1,171 @@
+import ast
 import calendar
+from collections import namedtuple
 from datetime import datetime, date, timedelta
-from liquicomun.datetime.season import last_sunday
+from liquicomun.datetime.season import year_calendar
+from .snapshot import read_snapshot, write_snapshot
 from builtins import range
+import numpy as np
+
+# Available matrix storages:
+# - 'list': list of num_days lists of 25 values (historical)
+# - 'numpy': float64 ndarray with shape (num_days, 25)
+STORAGES = ('list', 'numpy')
+
+SCALAR_TYPES = (int, float, np.number)
+
+OPERATIONS = {
+    'add': lambda a, b: a + b,
+    'radd': lambda a, b: b + a,
+    'sub': lambda a, b: a - b,
+    'rsub': lambda a, b: b - a,
+    'mul': lambda a, b: a * b,
+    'rmul': lambda a, b: b * a,
+    'truediv': lambda a, b: a / b,
+    'rtruediv': lambda a, b: b / a,
+}
+
+# In place numpy operations
+UFUNCS = {
+    'add': np.add,
+    'sub': np.subtract,
+    'mul': np.multiply,
+    'truediv': np.true_divide,
+}
+
+# Operators accepted by Component.evaluate
+EXPRESSION_OPERATORS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.true_divide,
+}
+
+# Parsed expressions of Component.evaluate
+EXPRESSIONS_CACHE_SIZE = 256
+_EXPRESSIONS = {}
+
+AuditColumns = namedtuple('AuditColumns', ['dates', 'hours', 'values', 'version'])
+AuditColumns.__doc__ = '''
+Audit data of some days: dates (datetime64[D]) and hours (1 to 25) of every value and the file version
+'''
+
+
+def round_values(values, digits=0):
+    '''Rounds the array as python round() does, without negative zeros.
+
+    np.round scales by 10**digits and may differ from the correctly rounded
+    python round() on the values close to a tie, those are rounded one by one
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, digits)
+    scaled = values * 10 ** digits
+    ties = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6
+    if ties.any():
+        rounded[ties] = [round(value, digits) for value in values[ties].tolist()]
+    return rounded + 0.0
+
+
+def audit_labels(columns):
+    '''Returns the YYYY-MM-DD HH label of every value of the AuditColumns'''
+    dates = np.char.add(np.datetime_as_string(columns.dates, unit='D'), ' ')
+    return np.char.add(dates, np.char.zfill(columns.hours.astype(str), 2))
+
+
+def _evaluate(node, operands):
+    '''Evaluates the expression node: (value, value is a temporary matrix)'''
+    if isinstance(node, ast.BinOp) and type(node.op) in EXPRESSION_OPERATORS:
+        ufunc = EXPRESSION_OPERATORS[type(node.op)]
+        left, left_temporary = _evaluate(node.left, operands)
+        right, right_temporary = _evaluate(node.right, operands)
+        if isinstance(left, float) and isinstance(right, float):
+            return float(ufunc(left, right)), False
+        if left_temporary:
+            return ufunc(left, right, out=left), True
+        if right_temporary:
+            return ufunc(left, right, out=right), True
+        return ufunc(left, right), True
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value, temporary = _evaluate(node.operand, operands)
+        if isinstance(node.op, ast.UAdd):
+            return value, temporary
+        if isinstance(value, float):
+            return -value, False
+        if temporary:
+            return np.negative(value, out=value), True
+        return np.negative(value), True
+    if isinstance(node, ast.Name):
+        if node.id not in operands:
+            raise ValueError('Unknown operand {}'.format(node.id))
+        return operands[node.id], False
+    if type(node).__name__ in ('Constant', 'Num'):
+        value = node.value if type(node).__name__ == 'Constant' else node.n
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value), False
+    raise ValueError('Invalid expression element {}'.format(ast.dump(node)))
+
 
 class Component(object):
     '''Component to calculate cost'''
-    def __init__(self, data=None, version=None):
+    storage = 'list'
+    # Attributes kept in the binary snapshots
+    snapshot_fields = ('year', 'month', 'version')
+    # Version of the REE file it was loaded from, if any
+    file_version = ''
+
+    def __init__(self, data=None, version=None, storage=None):
         if not data:
             data = datetime.today()
         if not isinstance(data, (datetime, date)):
             raise ValueError('Invalid date passed')
         if not version:
             version = data.strftime("%Y%m%d%H%M%S")
+        if storage is not None:
+            self.storage = storage
+        if self.storage not in STORAGES:
+            raise ValueError('Invalid storage %s' % self.storage)
 
         self.year = data.year
         self.month = data.month
-        self.matrix = []
         self.version = version
 
         monthdays = calendar.monthrange(self.year, self.month)[1]
-        for day in range(0, monthdays):
-            self.matrix.append([0 for d in range(0, 25)])
+        if self.storage == 'numpy':
+            self.matrix = np.zeros((monthdays, 25), dtype=np.float64)
+        else:
+            self.matrix = []
+            for day in range(0, monthdays):
+                self.matrix.append([0 for d in range(0, 25)])
+
+    def save_snapshot(self, path):
+        '''Saves the component as a binary snapshot'''
+        header = dict((field, getattr(self, field, None)) for field in self.snapshot_fields)
+        write_snapshot(path, header, self.matrix)
+
+    @classmethod
+    def load_snapshot(cls, path, mmap=False, storage='numpy'):
+        '''Returns the component saved in the snapshot
+        :param mmap: memory maps the matrix (copy on write), keeping the file open
+        :param storage: matrix storage of the loaded component
+        '''
+        component = cls.__new__(cls)
+        component.read_snapshot(path, mmap=mmap, storage=storage)
+        return component
+
+    def read_snapshot(self, path, mmap=False, storage='numpy'):
+        '''Loads the snapshot into this component'''
+        header, matrix = read_snapshot(path, mmap=mmap)
+        self.apply_snapshot(header, matrix, storage=storage)
+
+    def apply_snapshot(self, header, matrix, storage='numpy'):
+        '''Loads an already read snapshot into this component'''
+        for field, value in header.items():
+            setattr(self, field, value)
+        self.storage = storage
+        if storage == 'numpy':
+            self.matrix = matrix
+        else:
+            self.matrix = matrix.tolist()
 
     def get_weekday(self, day):
         return calendar.weekday(self.year, self.month, day)
@@ -48,11 +193,24 @@ class Component(object):
         self.matrix[day - 1][hour] = value
         return True
 
+    def as_array(self):
+        '''Returns the matrix as a float64 ndarray (num_days x 25).
+        With numpy storage the returned array is the matrix itself'''
+        return np.asarray(self.matrix, dtype=np.float64)
+
     def load(self, data):
         if len(data) != len(self.matrix):
             return False
         if len(data[0]) != len(self.matrix[0]):
             return False
+        if self.storage == 'numpy':
+            values = np.asarray(data, dtype=np.float64)
+            if values.shape != self.matrix.shape:
+                return False
+            self.matrix[:] = values
+            return True
+        if isinstance(data, np.ndarray):
+            data = data.tolist()
         row_counter = 0
         for row in data:
             field_counter = 0
@@ -64,18 +222,23 @@ class Component(object):
 
     def __operate(self, other, op='add'):
 
-        if not isinstance(other, (int, float)):
+        if not isinstance(other, SCALAR_TYPES):
             if self.num_days != other.num_days:
                 return False
             if self.month != other.month or self.year!=other.year:
                 return False
+            if other.storage == 'numpy':
+                return self.__operate_numpy(other, op)
+        if self.storage == 'numpy':
+            return self.__operate_numpy(other, op)
+
         c3 = Component(date(self.year, self.month, 1))
         row_counter = 0
         for row in self.matrix:
             field_counter = 0
             for v in row:
                 self_value = self.get(row_counter + 1, field_counter)
-                if not isinstance(other, (int, float)):
+                if not isinstance(other, SCALAR_TYPES):
                     other_value = other.get(row_counter + 1, field_counter)
                 else:
                     other_value = other
@@ -88,6 +251,10 @@ class Component(object):
                     res = self_value - other_value
                 elif op in ['rsub']:
                     res = other_value - self_value
+                elif op in ['truediv']:
+                    res = self_value / other_value
+                elif op in ['rtruediv']:
+                    res = other_value / self_value
 
                 c3.set(row_counter + 1, field_counter, res)
                 field_counter += 1
@@ -95,6 +262,98 @@ class Component(object):
 
         return c3
 
+    def __operate_numpy(self, other, op):
+        '''Whole matrix operation. other may be a scalar, a matrix or a component of any storage'''
+        if isinstance(other, Component):
+            other = other.as_array()
+        if not isinstance(other, SCALAR_TYPES):
+            other = np.asarray(other, dtype=np.float64)
+        return Component.from_matrix(self.year, self.month, OPERATIONS[op](self.as_array(), other))
+
+    def __ioperate(self, other, op):
+        '''In place operation, returns self or False as the other operations'''
+        if not isinstance(other, SCALAR_TYPES):
+            if self.num_days != other.num_days:
+                return False
+            if self.month != other.month or self.year != other.year:
+                return False
+            other = other.matrix
+        if self.storage != 'numpy':
+            row_counter = 0
+            for row in self.matrix:
+                for field_counter in range(len(row)):
+                    if isinstance(other, SCALAR_TYPES):
+                        other_value = other
+                    else:
+                        other_value = other[row_counter][field_counter]
+                    row[field_counter] = OPERATIONS[op](row[field_counter], other_value)
+                row_counter += 1
+            return self
+        if not isinstance(other, SCALAR_TYPES):
+            other = np.asarray(other, dtype=np.float64)
+        ufunc = UFUNCS[op]
+        if self.matrix.flags.writeable:
+            ufunc(self.matrix, other, out=self.matrix)
+        else:
+            # Read only mappings (stores, snapshots) are replaced
+            self.matrix = ufunc(self.matrix, other)
+        return self
+
+    @classmethod
+    def from_matrix(cls, year, month, matrix, version=None):
+        '''Returns a numpy component of the month with the matrix, without copying it'''
+        component = cls.__new__(cls)
+        component.year = year
+        component.month = month
+        component.version = version or date(year, month, 1).strftime("%Y%m%d%H%M%S")
+        if cls.storage != 'numpy':
+            component.storage = 'numpy'
+        component.matrix = matrix
+        return component
+
+    @classmethod
+    def evaluate(cls, expression, **operands):
+        '''Evaluates an arithmetic expression of components as whole matrix operations.
+
+        Operands are components of the same month or numbers. The expression
+        accepts +, -, *, /, parenthesis and numbers, no intermediate component
+        is built and the temporary matrices are reused as outputs:
+
+            Component.evaluate('a * (1 + b / 100) + c', a=price, b=loss, c=fee)
+
+        :return: numpy component of the month
+        :raises ValueError: invalid expression, unknown operand or operands of different months
+        '''
+        tree = _EXPRESSIONS.get(expression)
+        if tree is None:
+            try:
+                tree = ast.parse(expression.strip(), mode='eval').body
+            except SyntaxError as e:
+                raise ValueError('Invalid expression {!r}: {}'.format(expression, e))
+            if len(_EXPRESSIONS) >= EXPRESSIONS_CACHE_SIZE:
+                _EXPRESSIONS.clear()
+            _EXPRESSIONS[expression] = tree
+        first = None
+        matrices = {}
+        for name, operand in operands.items():
+            if isinstance(operand, SCALAR_TYPES):
+                matrices[name] = float(operand)
+                continue
+            if first is None:
+                first = operand
+            elif (first.year, first.month, first.num_days) != (operand.year, operand.month, operand.num_days):
+                raise ValueError('Operand {} is not of {:04d}/{:02d}'.format(name, first.year, first.month))
+            matrices[name] = operand.as_array()
+        if first is None:
+            raise ValueError('Expression {!r} has no component operand'.format(expression))
+
+        values, temporary = _evaluate(tree, matrices)
+        if isinstance(values, float):
+            values = np.full((first.num_days, 25), values)
+        elif not temporary:
+            values = values.copy()
+        return Component.from_matrix(first.year, first.month, values)
+
     def __add__(self, other, op='add'):
         return self.__operate(other, op)
 
@@ -113,6 +372,29 @@ class Component(object):
     def __rmul__(self, other, op='rmul'):
         return self.__operate(other, op)
 
+    def __truediv__(self, other, op='truediv'):
+        return self.__operate(other, op)
+
+    def __rtruediv__(self, other, op='rtruediv'):
+        return self.__operate(other, op)
+
+    __div__ = __truediv__
+    __rdiv__ = __rtruediv__
+
+    def __iadd__(self, other):
+        return self.__ioperate(other, 'add')
+
+    def __isub__(self, other):
+        return self.__ioperate(other, 'sub')
+
+    def __imul__(self, other):
+        return self.__ioperate(other, 'mul')
+
+    def __itruediv__(self, other):
+        return self.__ioperate(other, 'truediv')
+
+    __idiv__ = __itruediv__
+
     def __str__(self):
         return "[%s,\n %s]" % (self._str_head, self._str_data)
 
@@ -151,13 +433,17 @@ class Component(object):
         pos = 0
         for d in self.matrix:
             fill = pos and ' ' or '['
-            str += "%s['%02d', %s],\n" % (fill, pos + 1, self.matrix[pos])
+            if isinstance(d, np.ndarray):
+                d = d.tolist()
+            str += "%s['%02d', %s],\n" % (fill, pos + 1, d)
             pos += 1
         str += "]"
         return str
 
     @property
     def total_sum(self):
+        if self.storage == 'numpy':
+            return float(self.matrix.sum())
         total = sum(self.matrix[0])
         for d in self.matrix[1:]:
             total += sum(d)
@@ -172,33 +458,33 @@ class Component(object):
         :param end: end_day (included)
         :return: [(YYYY-MM-DD HH, value), (YYYY-MM-DD HH), ..)]
         '''
+        return list(self.iter_audit_data(start, end))
+
+    def iter_audit_data(self, start=False, end=False, chunk_days=7):
+        '''Generator of the get_audit_data tuples'''
+        for columns in self.iter_audit_columns(start, end, chunk_days):
+            for label, value in zip(audit_labels(columns).tolist(), columns.values.tolist()):
+                yield label, value, columns.version, ''
+
+    def iter_audit_columns(self, start=False, end=False, chunk_days=7):
+        '''Yields the audit data as AuditColumns of `chunk_days` days
+        :param start: start_day (included)
+        :param end: end_day (included)
+        '''
         start_day = start or 1
         end_day = end or self.num_days
-        audit_data = []
-        for day in range(start_day - 1, end_day):
-            leap_hours = 0
-            if self.month == 3:
-                leap_day = last_sunday(self.year, self.month)
-                if day == leap_day:
-                    leap_hours = -1
-            elif self.month == 10:
-                leap_day = last_sunday(self.year, self.month)
-                if day == leap_day:
-                    leap_hours = 1
-            num_hours = 24 + leap_hours
-            h = 0
-            file_version = getattr(self, 'file_version', '')
-            for data in self.matrix[day][:num_hours]:
-                h += 1
-                audit_data.append(
-                    (
-                        '{0:04d}-{1:02d}-{2:02d} {3:02d}'.format(
-                            self.year, self.month, day + 1, h
-                        ),
-                        round(data, 6),
-                        file_version,
-                        ''
-                    )
-                )
-
-        return audit_data
+        day_hours = year_calendar(self.year).month_hours(self.month)
+        file_version = getattr(self, 'file_version', '')
+        first_date = np.datetime64(date(self.year, self.month, 1), 'D')
+        matrix = self.as_array()
+        slots = np.arange(25)
+        for first in range(start_day - 1, end_day, chunk_days):
+            last = min(first + chunk_days, end_day)
+            hours = day_hours[first:last]
+            hours_mask = slots < hours[:, np.newaxis]
+            yield AuditColumns(
+                np.repeat(first_date + np.arange(first, last), hours),
+                (np.nonzero(hours_mask)[1] + 1).astype(np.int8),
+                round_values(matrix[first:last][hours_mask], 6),
+                file_version,
+            )
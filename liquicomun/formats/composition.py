@@ -0,0 +1,80 @@
+"""
+Composition of the final hourly energy prices of many tariffs.
+
+The price components of a month are summed once and the prices of all the
+tariffs are computed as a single broadcasted tariff x day x hour operation:
+
+    final[tariff, day, hour] = energy[day, hour] * (1 + losses[tariff, day, hour] / 100) + adjustments[day, hour]
+"""
+import numpy as np
+
+from .component import Component, SCALAR_TYPES
+from .perdidas import stack_losses
+
+
+class PriceComposer(object):
+    """
+    Final prices of a month for many tariffs
+
+    energy: components (or numbers) of the price affected by the losses, i.e. Prmdiari, Grcosdnc, Prgpncur
+    adjustments: components (or numbers) added after the losses
+    """
+    def __init__(self, energy, adjustments=()):
+        components = [
+            component for component in list(energy) + list(adjustments)
+            if not isinstance(component, SCALAR_TYPES)
+        ]
+        if not components:
+            raise ValueError('No price component')
+        first = components[0]
+        for component in components[1:]:
+            if (component.year, component.month, component.num_days) != (first.year, first.month, first.num_days):
+                raise ValueError('Price components of different months')
+        self.year = first.year
+        self.month = first.month
+        self.num_days = first.num_days
+        self.energy = self._sum(energy)
+        self.adjustments = self._sum(adjustments)
+
+    def _sum(self, components):
+        """ num_days x 25 sum of the components """
+        total = np.zeros((self.num_days, 25), dtype=np.float64)
+        for component in components:
+            if isinstance(component, SCALAR_TYPES):
+                total += component
+            else:
+                total += component.as_array()
+        total.setflags(write=False)
+        return total
+
+    def compose_array(self, losses):
+        """
+        Returns the tariffs x days x 25 array of the final prices, NaN where the losses are NaN
+
+        :param losses: tariffs x days x 25 array of the losses (see Perdidas.batch) or
+            list of losses, None for the not available ones
+        """
+        if not isinstance(losses, np.ndarray):
+            losses = stack_losses(losses, self.num_days)
+        if losses.ndim != 3 or losses.shape[1:] != (self.num_days, 25):
+            raise ValueError('Losses of shape {} are not of {:04d}/{:02d}'.format(
+                losses.shape, self.year, self.month
+            ))
+        prices = np.divide(losses, 100.0)
+        prices += 1.0
+        prices *= self.energy
+        prices += self.adjustments
+        return prices
+
+    def compose(self, losses):
+        """
+        Returns the final prices of every tariff as numpy components, None for the not available losses.
+        Components are views of a single tariffs x days x 25 array
+
+        :param losses: see compose_array
+        """
+        prices = self.compose_array(losses)
+        return [
+            None if np.isnan(tariff_prices).all() else Component.from_matrix(self.year, self.month, tariff_prices)
+            for tariff_prices in prices
+        ]
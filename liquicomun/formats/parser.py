@@ -0,0 +1,122 @@
+import csv
+
+import numpy as np
+
+
+class REEReader(object):
+    """
+    Streaming reader of the ';' separated REE daily format:
+
+    - header: file name and an empty field
+    - version: YYYY;MM;DD;HH;MM;SS
+    - one row per day: date and 25 hourly values
+    - footer: *
+
+    Header and version are read and validated on creation. Days are
+    parsed straight into a preallocated num_days x 25 buffer, no string
+    rows are kept in memory.
+    """
+    def __init__(self, stream, name, check_name=True):
+        """
+        :param stream: text stream
+        :param name: file name, used in the error messages
+        :param check_name: header must start as the name
+        """
+        self.name = name
+        self.reader = csv.reader(stream, delimiter=';')
+        header = next(self.reader, None)
+        if not header:
+            raise ValueError('Empty File')
+        if len(header) != 2 or (check_name and not header[0].startswith(name[:4])):
+            raise self.error()
+        version = next(self.reader, None)
+        if not version:
+            raise self.error()
+        self.version = ''.join(version[:6])
+
+    def error(self):
+        return ValueError('Bad %s file format' % self.name)
+
+    def read_into(self, out, num_days, convert=float, empty=0.0):
+        """
+        Reads all the days into `out` and validates the footer
+
+        :param out: num_days x 25 buffer (ndarray or list of lists)
+        :param convert: converts a non empty value
+        :param empty: value of the empty (or zero) ones
+        :return: out
+        """
+        day = 0
+        for row in self.reader:
+            if row and row[0] == '*':
+                break
+            if day >= num_days:
+                raise self.error()
+            values = [v and convert(v) or empty for v in row[1:26]]
+            out_row = out[day]
+            out_row[:len(values)] = values
+            day += 1
+        else:
+            # No footer
+            raise self.error()
+        if day != num_days:
+            raise self.error()
+        return out
+
+
+class REEHourlyReader(REEReader):
+    """
+    Streaming reader of the ';' separated REE hourly format (i.e. grcosdnc):
+
+    - header and version as the daily format
+    - one row per hour: YYYYMM DD HH date and the values
+    - footer: *
+
+    Only the requested columns are kept, converted at once as arrays.
+    """
+    def __init__(self, stream, name, num_fields, check_name=True):
+        """
+        :param num_fields: fields of every hour row
+        """
+        super(REEHourlyReader, self).__init__(stream, name, check_name=check_name)
+        self.num_fields = num_fields
+
+    def read_columns(self, columns):
+        """
+        Reads all the hours and validates the footer
+
+        :param columns: positions of the fields to read, empty fields are 0.0
+        :return: (days, hours, values): 1 based day and hour of every row and
+            its values as a float64 array of rows x len(columns)
+        """
+        days = []
+        hours = []
+        values = []
+        for row in self.reader:
+            if row and row[0] == '*':
+                break
+            if len(row) != self.num_fields:
+                raise self.error()
+            date = row[0]
+            if len(date) == 12:
+                # YYYYMM DD HH
+                days.append(date[7:9])
+                hours.append(date[10:12])
+            else:
+                date = date.split()
+                if len(date) != 3:
+                    raise self.error()
+                days.append(date[1])
+                hours.append(date[2])
+            values.append([row[column] or '0' for column in columns])
+        else:
+            # No footer
+            raise self.error()
+        try:
+            return (
+                np.array(days, dtype=str).astype(np.intp),
+                np.array(hours, dtype=str).astype(np.intp),
+                np.array(values, dtype=str).reshape(len(values), len(columns)).astype(np.float64),
+            )
+        except ValueError:
+            raise self.error()
@@ -1,4 +1,19 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+import calendar
+
+import numpy as np
+
 from .ree import REEformat
+from liquicomun.datetime.season import year_calendar
+from liquicomun.metrics import Metrics, collecting
+
+HourlySeries = namedtuple('HourlySeries', ['dates', 'hours', 'values'])
+HourlySeries.__doc__ = """
+Values of every real local hour: dates (datetime64[D]), hours of the day (1 to 25) and values
+"""
 
 
 def REE_perd_name(subsystem):
@@ -91,7 +106,14 @@ class Perdida(REEformat):
     - date_end
     - subsystem (optional)
     - version (optional)
+    - storage (optional) matrix storage, 'list' or 'numpy'
+    - reads (optional) files already parsed by other k_coeffs losses of the same period, see `batch`
+    - lazy (optional) do not download and parse the file until the matrix (or any data) is used
+    - client (optional) ESIOS client shared by many losses, see EsiosClient
     """
+    snapshot_fields = REEformat.snapshot_fields + ('tariff', 'subsystem', 'date_start', 'date_end')
+    request_fields = ('tariff', 'subsystem', 'date_start', 'date_end')
+
     def __init__(self, filename=None, **request):
         # Default values if not provided
         version = "A1"
@@ -183,7 +205,10 @@ class Perdida(REEformat):
             self.name = REEfile
             self.file_tmpl = REEfile
 
-            super(Perdida, self).__init__(filename=filename, k_table=ktable, tariff=tariff)
+            super(Perdida, self).__init__(
+                filename=filename, k_table=ktable, tariff=tariff, storage=request.get('storage'),
+                reads=request.get('reads'), lazy=request.get('lazy', False), client=request.get('client'),
+            )
         else:
             if filename:
                 filename_list = filename.split("_")
@@ -244,14 +269,196 @@ class Perdida(REEformat):
             self.name = REEfile
             self.file_tmpl = REEfile
 
-            super(Perdida, self).__init__(filename=filename)
+            super(Perdida, self).__init__(
+                filename=filename, storage=request.get('storage'), lazy=request.get('lazy', False),
+                client=request.get('client'),
+            )
+
+    @classmethod
+    def batch(cls, tariffs, date_start, date_end, **request):
+        """
+        Computes the k_coeffs losses of many tariffs parsing the K file and every distinct
+        periods table just once
+
+        Accepts the same optional subsystem, version and storage of a Perdida
+
+        :param tariffs: list of tariffs
+        :return: (list of Perdida, tariffs x days x 25 array of their losses)
+        """
+        request = dict(request, date_start=date_start, date_end=date_end, type_import='k_coeffs')
+        request.setdefault('reads', {})
+        losses = [cls(tariff=tariff, **request) for tariff in tariffs]
+        return losses, stack_losses(losses)
+
+
+def resolved(loss):
+    """
+    Loads a lazy loss, returns None if it is not available
+    """
+    if loss is None or loss.loaded:
+        return loss
+    try:
+        return loss.resolve()
+    except:
+        return None
+
+
+def stack_losses(losses, num_days=None):
+    """
+    Stacks the matrices of the losses as a losses x days x 25 array, NaN for the None ones
+    """
+    if num_days is None:
+        num_days = max([loss.num_days for loss in losses if loss is not None] or [0])
+    stacked = np.full((len(losses), num_days, 25), np.nan)
+    for position, loss in enumerate(losses):
+        if loss is not None:
+            stacked[position] = loss.as_array()
+    return stacked
+
+
+def month_ranges(date_start, date_end):
+    """
+    Splits the 'YYYYMMDD' range in the monthly periods of the REE files
+
+    :return: [('YYYYMMDD', 'YYYYMMDD')] first and last day of every month of the range
+    """
+    start = datetime.strptime(date_start, '%Y%m%d')
+    end = datetime.strptime(date_end, '%Y%m%d')
+    year, month = start.year, start.month
+    months = []
+    while (year, month) <= (end.year, end.month):
+        last_day = calendar.monthrange(year, month)[1]
+        months.append(('{:04d}{:02d}01'.format(year, month), '{:04d}{:02d}{:02d}'.format(year, month, last_day)))
+        year, month = year + month // 12, month % 12 + 1
+    return months
+
+
+class PerdidaSeries(object):
+    """
+    Losses of a tariff and subsystem for a range of many months, as one continuous series.
+
+    Every month is a Perdida of its whole REE file, None if not available. Only the
+    days between date_start and date_end are used and the hours are concatenated as
+    the calendar of every day has them: 23 hours the March DST day, 25 the October one.
+    The hours of the not available months are NaN
+    """
+    def __init__(self, tariff, subsystem, date_start, date_end, losses):
+        """
+        :param losses: Perdida of every month of month_ranges(date_start, date_end), or None
+        """
+        self.tariff = tariff
+        self.subsystem = subsystem
+        self.date_start = date_start
+        self.date_end = date_end
+        self.months = month_ranges(date_start, date_end)
+        assert len(losses) == len(self.months)
+        self.losses = losses
+
+    @property
+    def loaded(self):
+        return all(loss is None or loss.loaded for loss in self.losses)
+
+    def resolve(self):
+        """
+        Loads the lazy losses, the not available months become None
+
+        :raises ValueError: no month is available
+        """
+        self.losses = [resolved(loss) for loss in self.losses]
+        if all(loss is None for loss in self.losses):
+            raise ValueError('No month of {}-{} is available'.format(self.date_start, self.date_end))
+        return self
+
+    @property
+    def missing(self):
+        """
+        'YYYYMM' of the not available months
+        """
+        self.losses = [resolved(loss) for loss in self.losses]
+        return [start[:6] for (start, end), loss in zip(self.months, self.losses) if loss is None]
+
+    @property
+    def versions(self):
+        """
+        File version of every month, None for the not available ones
+        """
+        self.losses = [resolved(loss) for loss in self.losses]
+        return [loss and loss.file_version for loss in self.losses]
+
+    def _days(self):
+        """
+        Yields (month position, year, month, first day index, last day index) of the range
+        """
+        for position, (start, end) in enumerate(self.months):
+            first = 0
+            last = int(end[6:])
+            if position == 0:
+                first = int(self.date_start[6:]) - 1
+            if position == len(self.months) - 1:
+                last = int(self.date_end[6:])
+            yield position, int(start[:4]), int(start[4:6]), first, last
+
+    @property
+    def num_days(self):
+        return sum(last - first for _, _, _, first, last in self._days())
+
+    def as_array(self):
+        """
+        Returns the days of the range as a float64 ndarray (num_days x 25), NaN for the not available months
+        """
+        self.losses = [resolved(loss) for loss in self.losses]
+        days = []
+        for position, year, month, first, last in self._days():
+            loss = self.losses[position]
+            if loss is None:
+                days.append(np.full((last - first, 25), np.nan))
+            else:
+                days.append(loss.as_array()[first:last])
+        return np.concatenate(days)
+
+    def hourly(self):
+        """
+        Returns the HourlySeries of every real hour of the range, in order
+        """
+        matrix = self.as_array()
+        slots = np.arange(25)
+        dates = []
+        hours = []
+        for position, year, month, first, last in self._days():
+            day_hours = year_calendar(year).month_hours(month)[first:last]
+            dates.append(np.repeat(np.datetime64(date(year, month, 1), 'D') + np.arange(first, last), day_hours))
+            hours.append(day_hours)
+        hours = np.concatenate(hours)
+        hours_mask = slots < hours[:, np.newaxis]
+        return HourlySeries(
+            np.concatenate(dates), (np.nonzero(hours_mask)[1] + 1).astype(np.int8), matrix[hours_mask]
+        )
+
+    @property
+    def total_sum(self):
+        return float(np.nansum(self.hourly().values))
+
+    def iter_audit_columns(self, start=False, end=False, chunk_days=7):
+        """
+        Yields the audit data of the available months as AuditColumns, see Component.iter_audit_columns.
+        Every month is limited to the days of the range, start and end days are not supported
+        """
+        if start or end:
+            raise ValueError('Start and end days are not supported by a series, use its date range')
+        self.losses = [resolved(loss) for loss in self.losses]
+        for position, year, month, first, last in self._days():
+            loss = self.losses[position]
+            if loss is not None:
+                for columns in loss.iter_audit_columns(first + 1, last, chunk_days):
+                    yield columns
 
 
 class Perdidas:
     """
     Perdidas class, provide an iterable way to fetch all available losses between a range of dates.
     """
-    def __init__(self, date_start, date_end, tariffs=None, subsystems=None, type_import=None):
+    def __init__(self, date_start, date_end, tariffs=None, subsystems=None, type_import=None, storage=None,
+                 workers=None, lazy=False, client=None):
         """
         Initializes the Perdidas instance with the start and ending date.
 
@@ -261,10 +468,27 @@ class Perdidas:
         Optionally,
         - can retreive for the passed list of tariffs
         - can retreive for the passed list of subsystems
+        - can store the matrices using the passed storage ('list' or 'numpy')
+        - can fetch the losses concurrently using a pool of `workers` threads
+        - can return lazy losses, downloaded and parsed when their data is first used
+        - can download the archives with the passed ESIOS client (see EsiosClient)
+
+        Ranges of many months are split in the monthly REE files, fetched concurrently,
+        and every loss is a PerdidaSeries of the whole range.
+
+        The metrics of all the fetched losses are recorded in `metrics`
         """
 
         self.date_start = date_start
         self.date_end = date_end
+        self.months = month_ranges(date_start, date_end)
+        self.storage = storage
+        self.workers = workers
+        self.lazy = lazy
+        self.client = client
+        self.metrics = Metrics()
+        # k_coeffs files parsed by the fetched losses, shared by all of them
+        self.reads = {}
 
         # type_import must be in ['perd_files', 'k_coeffs']
         assert type_import in ['perd_files', 'k_coeffs'] and type(type_import) == str
@@ -293,12 +517,110 @@ class Perdidas:
         else:
             self.subsystems = available_subsystems
 
+    @property
+    def grid(self):
+        """
+        List of (subsystem, tariff) to process, in iteration order
+        """
+        return [
+            (subsystem, tariff) for subsystem in self.subsystems for tariff in self.tariffs
+        ]
+
+    @property
+    def periods(self):
+        """
+        List of (date_start, date_end) fetched for every loss, one for each month of the range
+        """
+        if len(self.months) == 1:
+            return [(self.date_start, self.date_end)]
+        return self.months
+
+    def fetch(self, subsystem, tariff):
+        """
+        Returns the Perdida of the subsystem and tariff or None if it is not available.
+        Lazy losses are always returned, they raise when loaded if not available
+
+        Ranges of many months return a PerdidaSeries, None if no month is available
+        """
+        if len(self.months) == 1:
+            return self._fetch_month(subsystem, tariff, self.date_start, self.date_end)
+
+        with ThreadPoolExecutor(max_workers=min(self.workers or len(self.months), len(self.months))) as executor:
+            losses = list(executor.map(lambda period: self._fetch_month(subsystem, tariff, *period), self.periods))
+        return self._join_months(subsystem, tariff, losses)
+
+    def _join_months(self, subsystem, tariff, losses):
+        if len(self.months) == 1:
+            return losses[0]
+        if all(loss is None for loss in losses):
+            return None
+        return PerdidaSeries(tariff, subsystem, self.date_start, self.date_end, losses)
+
+    def _fetch_month(self, subsystem, tariff, date_start, date_end):
+        current_params = {
+            'date_start': date_start,
+            'date_end': date_end,
+            'tariff': tariff,
+            'subsystem': subsystem,
+            'type_import': self.type_import,
+            'storage': self.storage,
+            'lazy': self.lazy,
+            'client': self.client,
+        }
+        if self.type_import == 'k_coeffs':
+            current_params['reads'] = self.reads
+
+        with collecting(self.metrics):
+            try:
+                return Perdida(**current_params)
+            except:
+                return None
+
+    def fetch_all(self, workers=None):
+        """
+        Returns the list of losses of all the grid, None for the not available ones.
+
+        Losses are fetched by a pool of `workers` threads (the Perdidas workers by default)
+        and returned in the iteration order
+        """
+        return list(self._fetch_concurrently(workers or self.workers or 1))
+
+    def batch(self, subsystem='peninsula'):
+        """
+        Returns the losses of all the tariffs of the subsystem, None for the not available ones,
+        and the tariffs x days x 25 array of their values (NaN for the not available ones).
+
+        In k_coeffs mode every file is parsed just once for all the tariffs
+        """
+        losses = [resolved(self.fetch(subsystem, tariff)) for tariff in self.tariffs]
+        return losses, stack_losses(losses)
+
+    def _fetch_concurrently(self, workers):
+        # Every month of every loss goes to the same pool, so no more than `workers` threads are used
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = [
+                [executor.submit(self._fetch_month, subsystem, tariff, *period) for period in self.periods]
+                for subsystem, tariff in self.grid
+            ]
+            for (subsystem, tariff), futures in zip(self.grid, pending):
+                yield self._join_months(subsystem, tariff, [future.result() for future in futures])
+
+    def __aiter__(self):
+        """
+        Asynchronous iteration of tariffs and subsystems: `async for a_loss in losses`
+        """
+        from .aio import PerdidasAsyncIterator
+        return PerdidasAsyncIterator(self)
+
     def __iter__(self):
         """
         Initialize the iteration of tariffs and subsystems
         """
         self.current_subsystem = 0
         self.current_tariff = 0
+        self.pending = None
+        if self.workers:
+            self.pending = self._fetch_concurrently(self.workers)
         return self
 
     def next(self):
@@ -311,6 +633,9 @@ class Perdidas:
         """
         Next magic method to process the following element (from the scope of tariffs and subsystems)
         """
+        if self.pending is not None:
+            return next(self.pending)
+
         # If tariff out of scope, go to the next subsystem
         if self.current_tariff >= len(self.tariffs):
             self.current_subsystem += 1
@@ -321,19 +646,9 @@ class Perdidas:
             raise StopIteration
 
         # Prepare the Loss for the current iteration
-        current_params = {
-            'date_start': self.date_start,
-            'date_end': self.date_end,
-            'tariff': self.tariffs[self.current_tariff],
-            'subsystem': self.subsystems[self.current_subsystem],
-            'type_import': self.type_import
-        }
-
-        try:
-            current_loss = Perdida(**current_params)
-        except:
-            self.current_tariff += 1
-            return None
+        current_loss = self.fetch(
+            self.subsystems[self.current_subsystem], self.tariffs[self.current_tariff]
+        )
 
         # Prepare the next iteration
         self.current_tariff += 1
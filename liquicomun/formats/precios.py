@@ -1,86 +1,116 @@
+from datetime import datetime
+
+import numpy as np
+
+from .parser import REEHourlyReader
 from .ree import REEformat
+from liquicomun import metrics
+
 
-class Grcosdnc(REEformat):
+class Precio(REEformat):
     """
-    Componentes precio final por coste ajustes del sistema (EUR/MWh bc)
-    Comercializadores libres y consumidores directos
-    POS from XN_liquicom_YYYYMM.zip esios file
+    Initializes a price component from a set of conditions
+
+    It downloads the related LIQUICOMUN and try to find the requested file inside the zip
+    as Perdida does, sharing its cache, snapshots and ESIOS client.
+
+    Accept a filename or:
+    - date_start
+    - date_end
+    - version (optional)
+    - storage (optional) matrix storage, 'list' or 'numpy'
+    - lazy (optional) do not download and parse the file until the matrix (or any data) is used
+    - client (optional) ESIOS client shared by many components, see EsiosClient
+    - token (optional) ESIOS token of this component
     """
-    name = 'grcosdnc'
-    file_tmpl = 'grcosdnc'
+    snapshot_fields = REEformat.snapshot_fields + ('date_start', 'date_end')
+    request_fields = ('date_start', 'date_end')
 
-    def __init__(self, file=None, token=None):
-        super(Grcosdnc, self).__init__(file=file, token=token)
-
-    def check_data(self, rows):
-        if not rows:
-            raise ValueError('Empty File')
-        # 2 header + n days * 24 (+/- 1 Leap hour) + 1 footer
-        # (num_rows - 3) % 24 = 0 or 1 or 23
-        # A1 has only partial days
-        # 0: usually
-        # 1: summer to winter
-        # 23: winter to summer
-        if ((len(rows) - 3) % 24) not in [0, 1, 23]:
-            raise ValueError('Bad %s file format' % self.name)
+    def __init__(self, filename=None, **request):
+        if request.get('token'):
+            self.set_token(request['token'])
 
-        if len(rows[0]) < 2 or len(rows[0]) > 2 or not rows[0][0].startswith(self.name[:4]):
-            raise ValueError('Bad %s file format' % self.name)
+        if not filename:
+            # If no filename is provided, expect reach date_start and date_end
+            assert "date_start" in request and request['date_start'] and type(request['date_start']) == str
+            assert "date_end" in request and request['date_end'] and type(request['date_end']) == str
 
-        if len(rows[2]) != 15:
-            raise ValueError('Bad %s file format' % self.name)
+            # Optional version
+            version = "A1"
+            if "version" in request:
+                assert request['version'] and type(request['version']) == str
+                version = request['version']
 
-        if rows[-1][0] != '*':
-            raise ValueError('Bad %s file format' % self.name)
+            filename = "{version}_{REEfile}_{date_start}_{date_end}".format(
+                version=version,
+                REEfile=self.file_tmpl,
+                date_start=request['date_start'],
+                date_end=request['date_end'],
+            )
 
-    def _get_day_hour(self, date_field):
-        '''
-        Returns day and hour of date_field
-        :param date_field: date_fiel in format YYYYMM DD HH
-        :return: (day, hour)
-        '''
-        date_row = date_field.split(' ')
-        if len(date_row) < 2:
-            return 0, 0
-        return int(date_row[1]), int(date_row[2])
+        self.date_start = filename[-17:-9]
+        self.date_end = filename[-8:]
+
+        super(Precio, self).__init__(
+            filename=filename, storage=request.get('storage'), lazy=request.get('lazy', False),
+            client=request.get('client'),
+        )
+
+
+class Grcosdnc(Precio):
+    """
+    Componentes precio final por coste ajustes del sistema (EUR/MWh bc)
+    Comercializadores libres y consumidores directos
+    POS from XN_liquicom_YYYYMM.zip esios file
+    """
+    name = 'grcosdnc'
+    file_tmpl = 'grcosdnc'
+    # fields of every hour row
+    num_fields = 15
+    # date (YYYYMM DD HH) row[0]
+    # Factor Potencia: row[11]
+    # Total: row[12]
+    value_columns = (11, 12)
+
+    def loadstream(self, stream):
+        """
+        Parses the hourly rows of the file stream, not the daily REE format
+        """
+        with metrics.timer('validation'):
+            reader = REEHourlyReader(stream, self.name, self.num_fields)
+        filedate = datetime.strptime(self.filename[-8:], '%Y%m%d')
+
+        super(REEformat, self).__init__(data=filedate, version=reader.version)
+        with metrics.timer('parse'):
+            days, hours, values = reader.read_columns(self.value_columns)
+            self.load(self.hourly_matrix(days, hours, values[:, 0], values[:, 1]))
 
     def _get_value(self, pot, total):
         '''
         Returns total per hour. Its 'Coste Total' column
         adding 'Factor de potencia' column only when it's negative
-        :param pot: 'Factor de Potencia' column value
-        :param total: 'Coste Total' column value
+        :param pot: 'Factor de Potencia' column values (array or number)
+        :param total: 'Coste Total' column values (array or number)
         :return: Total as 'Coste Total' + 'Factor de potencia'
         '''
-        potencia = float(pot or '0.0')
-        if potencia < 0:
-            extra = potencia * -1.0
-        else:
-            extra = 0.0
-        return float(total) + float(extra)
-
-    def format_data(self, rows):
-        # formats data as 25 * num days matrix
-
-        # date (YYYYMM DD HH) row[0]
-        # Factor Potencia: row[12]
-        # Total: row[13]
-
-        monthdays = calendar.monthrange(self.year, self.month)[1]
-
-        matrix = []
-        for d in range(0, monthdays):
-            matrix.append([0 for h in range(0, 25)])
-
-        for row in rows[2:-1]:
-            day, hour = self._get_day_hour(row[0])
-            value = self._get_value(row[11], row[12])
-            matrix[day - 1][hour - 1] = value
+        pot = np.asarray(pot, dtype=np.float64)
+        total = np.asarray(total, dtype=np.float64)
+        return total - np.minimum(pot, 0.0)
 
+    def hourly_matrix(self, days, hours, pot, total):
+        '''
+        Returns the num_days x 25 matrix of the hourly values
+        :param days: 1 based day of every hour
+        :param hours: 1 based hour of the day of every hour
+        '''
+        if days.size and (days.min() < 1 or days.max() > self.num_days or hours.min() < 1 or hours.max() > 25):
+            raise ValueError('Bad %s file format' % self.name)
+        matrix = np.zeros((self.num_days, 25), dtype=np.float64)
+        matrix[days - 1, hours - 1] = self._get_value(pot, total)
         return matrix
 
 
-class Prmncur(REEformat):
+class Prmncur(Precio):
     """
     Coste medio horario en el mercado de produccion (EUR/MWh BC)
     Comercializadores, excepto de ultimo recurso, y consumidores directos
@@ -89,11 +119,8 @@ class Prmncur(REEformat):
     name = 'prmncur'
     file_tmpl = 'prmncur'
 
-    def __init__(self, file=None, token=None):
-        super(Prmncur, self).__init__(file=file, token=token)
-
 
-class Prmdiari(REEformat):
+class Prmdiari(Precio):
     """
     Precio del mercado diario (EUR/MWh)
     PMD from XN_liquicom_YYYYMM.zip esios file
@@ -101,17 +128,11 @@ class Prmdiari(REEformat):
     name = 'prmdiari'
     file_tmpl = 'prmdiari'
 
-    def __init__(self, file=None, token=None):
-        super(Prmdiari, self).__init__(file=file, token=token)
 
-
-class Prgpncur(REEformat):
+class Prgpncur(Precio):
     """
     Coste medio por pago por capacidad para demanda NO suministrada por CUR (EUR/MWh bc consumido)
     PC3 from XN_liquicom_YYYYMM.zip esios file
     """
     name = 'prgpncur'
     file_tmpl = 'prgpncur'
-
-    def __init__(self, file=None, token=None):
-        super(Prgpncur, self).__init__(file=file, token=token)
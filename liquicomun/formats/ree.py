@@ -1,16 +1,23 @@
 import re
-import fnmatch
 import os
 from datetime import datetime
-from io import BytesIO, TextIOWrapper
-from esios import Esios
 import csv
 import time
-import zipfile
 import sys
 import logging
+import functools
+import threading
 
-from .component import Component
+import numpy as np
+
+from .archive import ArchiveCache, VersionNotAvailable
+from .client import EsiosError
+from .cache import CacheStore, END_OF_VERSIONS
+from .component import Component, round_values
+from .parser import REEReader
+from .snapshot import read_snapshot
+from liquicomun import metrics
+from liquicomun.metrics import Metrics, collecting
 
 
 # https://www.boe.es/diario_boe/txt.php?id=BOE-A-2014-1052
@@ -38,10 +45,55 @@ LOSS_COEFF_BOE = {'20A': {'1': 14},
                   '61TDVE': {'1': 6.7, '2': 6.8, '3': 6.5, '4': 6.5, '5': 4.3, '6': 7.7}
                   }
 
+# tariff -> LOSS_COEFF_BOE coefficients indexed by period
+_LOSS_COEFF_TABLES = {}
+
+
+def loss_coeffs_table(tariff):
+    """
+    Returns the BOE loss coefficients of the tariff as an array indexed by period.
+
+    Period 0 (no period) is 0.0, periods without coefficient are NaN
+    """
+    table = _LOSS_COEFF_TABLES.get(tariff)
+    if table is None:
+        coeffs = LOSS_COEFF_BOE[tariff]
+        table = np.full(max(int(period) for period in coeffs) + 1, np.nan)
+        table[0] = 0.0
+        for period, coeff in coeffs.items():
+            table[int(period)] = coeff
+        table.setflags(write=False)
+        _LOSS_COEFF_TABLES[tariff] = table
+    return table
+
+
 # versions of ESIOS files with Kestimado
 estimation_calculated = ['C2', 'A2', 'C1', 'A1']
 
 
+class CacheDirStores(object):
+    """
+    Class attribute resolving the CacheStore or the ArchiveCache of the `_CACHE_DIR` of the
+    class, shared by all the formats. Both are built again when `_CACHE_DIR` changes, so
+    assigning it moves the cache
+    """
+    _built = None
+    _lock = threading.Lock()
+
+    def __init__(self, position):
+        self.position = position
+
+    def __get__(self, instance, owner):
+        directory = owner._CACHE_DIR
+        with self._lock:
+            stores = CacheDirStores._built
+            if stores is None or stores[0] != directory:
+                store = CacheStore(directory)
+                stores = (directory, store, ArchiveCache(os.path.join(directory, 'archives'), store=store))
+                CacheDirStores._built = stores
+        return stores[self.position]
+
+
 class REEformat(Component):
     """ REE esios common format """
     name = 'ree'
@@ -52,10 +104,15 @@ class REEformat(Component):
     file_origin = ''
     # token = ''
 
-    _CACHE_DIR = '/tmp/'
+    _CACHE_DIR = os.getenv('LIQUICOMUN_CACHE_DIR', '/tmp/liquicomun_cache')
     _CACHE_TIMEOUT = 3600
+    # Cache index and downloaded liquicomun ZIPs, shared by all the formats
+    _CACHE = CacheDirStores(1)
+    _ARCHIVES = CacheDirStores(2)
 
     token = os.getenv('ESIOS_TOKEN')
+    # Shared ESIOS client (see EsiosClient), a new Esios(token) for every request if None
+    client = None
 
     version_order = (
         # real
@@ -68,14 +125,45 @@ class REEformat(Component):
 
     no_cache = ('A2', 'C1', 'A1')
 
+    # Save a binary snapshot of the parsed components to skip the parse on warm starts
+    snapshots = True
+    snapshot_fields = Component.snapshot_fields + ('file_version', 'origin', 'filename', 'name', 'fetched_at')
+    # Snapshot fields set by the request, not restored on warm loads (snapshots are shared, i.e. by subsystems)
+    request_fields = ()
+    # When the source file was fetched, if cached
+    fetched_at = None
+    # Attributes that load a lazy component
+    lazy_fields = ('matrix', 'year', 'month', 'version', 'origin')
+
     def set_token(self, token):
         self.token = token
 
-    def __init__(self, filename=None, k_table=None, tariff=None):
+    def __init__(self, filename=None, k_table=None, tariff=None, storage=None, reads=None, lazy=False,
+                 client=None):
         """ Gets file from REE or disc and stores it in cache """
         """ If version is provided, ensure to fetch just this version """
-        rows = []
-
+        """ reads: {file name: (version, values)} shared by the components computed from the same files """
+        """ lazy: just look for the cached version, the file is loaded when its data is first used """
+        """ client: ESIOS client to download the archives, see EsiosClient """
+        if storage is not None:
+            self.storage = storage
+        if client is not None:
+            self.client = client
+
+        # Metrics of this load, also recorded in the global registry
+        self.metrics = self.__dict__.get('metrics') or Metrics()
+        # To load it again, see reload. The parsed files are not shared anymore
+        self._params = dict(filename=filename, k_table=k_table, tariff=tariff, storage=storage)
+
+        if lazy:
+            self._defer(filename=filename, k_table=k_table, tariff=tariff, storage=storage, reads=reads)
+            return
+
+        with collecting(self.metrics):
+            self._load(filename, k_table, tariff, reads)
+
+    def _load(self, filename, k_table=None, tariff=None, reads=None):
+        """ Finds the file (and periods table) and loads it """
         final_file_name = ''
 
         self.file_name_re = '.+_%s(_2[0-9]{7}){2}$' % self.file_tmpl
@@ -87,49 +175,49 @@ class REEformat(Component):
 
         self.filename = os.path.basename(filename)
 
+        # source: function that opens the file as a text stream
         available_versions = self.version_order
         if os.path.isfile(filename):
-            with open(filename, 'rb') as csvfile:
-                reereader = csv.reader(csvfile, delimiter=';')
-                rows = [row for row in reereader]
-                found_version = self.filename[:2]
-                origin = 'file'
+            source = functools.partial(open, filename, 'r')
+            found_version = self.filename[:2]
+            final_file_name = self.filename
+            origin = 'file'
         else:
             found_version = ''
-            for version in available_versions:
+            candidates = self._candidates(filename, k_table)
+            filename = candidates[-1]
+            self.filename = filename
+
+            entry = self._CACHE.lookup(candidates, no_cache=self.no_cache, timeout=self._CACHE_TIMEOUT)
+            metrics.count(entry is None and 'cache_misses' or 'cache_hits')
+            if entry is not None:
+                found_version = entry.version
+                self.filename = entry.filename
                 if k_table is not None:
-                    if version in estimation_calculated:
-                        filename = filename.replace('real', 'estimado')
+                    final_file_name = entry.filename
+                    if 'estimado' in entry.filename:
                         self.name = self.name.replace('real', 'estimado')
-                filename = version + filename[2:]
-                self.filename = filename
-                filepath = self._CACHE_DIR + filename
-                if os.path.isfile(filepath):
-                    file_age = time.time() - os.path.getmtime(filepath)
-                    if version not in self.no_cache or file_age < self._CACHE_TIMEOUT:
-                        with open(self._CACHE_DIR + filename, 'r') as csvfile:
-                            found_version = version
-                            if k_table is not None:
-                                final_file_name = filename
-                            reereader = csv.reader(csvfile, delimiter=';')
-                            rows = [row for row in reereader]
-                            origin = 'cache'
-                            break
+                    else:
+                        self.name = self.name.replace('estimado', 'real')
+                source = functools.partial(self._CACHE.open, entry)
+                origin = 'cache'
+                if self._load_snapshot(entry, tariff):
+                    return
 
             if not found_version:
                 if k_table is None:
-                    rows = self.download(filename)
+                    source = self._locate(filename)
                 else:
                     filename = filename.replace('estimado', 'real')
                     self.name = self.name.replace('estimado', 'real')
                     try:
-                        rows = self.download_using_coeffs(filename)
+                        source = self._locate(filename)
                         final_file_name = self.filename
                     except ValueError:
                         print("No Kreal available. Switching to Kestimado.")
                         filename = filename.replace('real', 'estimado')
                         self.name = self.name.replace('real', 'estimado')
-                        rows = self.download_using_coeffs(filename)
+                        source = self._locate(filename)
                         final_file_name = self.filename
                 found_version = self.filename[:2]
                 origin = 'server'
@@ -138,163 +226,269 @@ class REEformat(Component):
         self.origin = origin
 
         if k_table is None:
-            self.loadfile(rows)
+            with source() as stream:
+                self.loadstream(stream)
+            self._save_snapshot(tariff)
         else:
-            periodstable = []
             # periods table for current tariff
             if os.path.isfile(k_table):
-                with open(k_table, 'rb') as csvfile:
-                    reereader = csv.reader(csvfile, delimiter=';')
-                    periodstable = [row for row in reereader]
+                k_source = functools.partial(open, k_table, 'r')
             else:
-                found_version = ''
-                for version in available_versions:
-                    k_table = version + k_table[2:]
-                    if (os.path.isfile(self._CACHE_DIR + k_table)
-                            and version not in self.no_cache):
-                        with open(self._CACHE_DIR + k_table, 'r') as csvfile:
-                            found_version = version
-                            reereader = csv.reader(csvfile, delimiter=';')
-                            periodstable = [row for row in reereader]
-                            break
-
-                if not found_version:
-                    periodstable = self.download_using_coeffs(k_table)
+                # estimated period tables are never taken from cache
+                candidates = [version + k_table[2:] for version in available_versions]
+                entry = self._CACHE.lookup(candidates, no_cache=self.no_cache)
+                metrics.count(entry is None and 'cache_misses' or 'cache_hits')
+                if entry is not None:
+                    k_source = functools.partial(self._CACHE.open, entry)
+                else:
+                    k_source = self._locate(candidates[-1], keep_filename=True)
 
             self.filename = final_file_name
-            self.loadfile_using_coeffs(rows, periodstable, tariff)
+            self.load_using_coeffs(source, k_source, tariff, reads=reads, periods_key=k_table)
+            self._save_snapshot(tariff)
 
-    @staticmethod
-    def clear_cache(version=''):
+    def _candidates(self, filename, k_table=None):
         """
-        :param version: Cn or An prefix. All if empty
-        :return: True or False
+        Returns the names of the file in all the versions, by priority
+        """
+        candidates = []
+        for version in self.version_order:
+            if k_table is not None:
+                if version in estimation_calculated:
+                    filename = filename.replace('real', 'estimado')
+            filename = version + filename[2:]
+            candidates.append(filename)
+        return candidates
+
+    def _defer(self, **params):
         """
-        if version:
-            prefixes = [version]
+        Sets the filename and file_version of the cached file, if any, and keeps the
+        constructor params to load it on first use
+        """
+        filename = params['filename']
+        self.file_name_re = '.+_%s(_2[0-9]{7}){2}$' % self.file_tmpl
+        if not filename:
+            raise ValueError('No File')
+        if not re.search(self.file_name_re, filename):
+            raise ValueError('Bad %s file name' % self.name)
+        self.filename = os.path.basename(filename)
+        if os.path.isfile(filename):
+            self.file_version = self.filename[:2]
         else:
-            prefixes = list(REEformat.version_order)
+            entry = self._CACHE.lookup(
+                self._candidates(filename, params['k_table']), no_cache=self.no_cache, timeout=self._CACHE_TIMEOUT
+            )
+            if entry is not None:
+                self.filename = entry.filename
+                self.file_version = entry.version
+        # The version is the one of the loaded file
+        self.__dict__.pop('version', None)
+        self._lazy_lock = threading.Lock()
+        # Also record the load metrics in the registries collecting now (i.e. the Perdidas ones)
+        self._collectors = metrics.active()
+        self._pending = params
+
+    @property
+    def loaded(self):
+        """ False until a lazy component is loaded """
+        return self.__dict__.get('_pending') is None
+
+    def resolve(self):
+        """
+        Loads a lazy component, does nothing if it is already loaded
 
-        directory = REEformat._CACHE_DIR
+        It is loaded apart and its data set at once, so it is pending for the
+        other threads (that wait for the load) until all its fields are set
+        """
+        if self.loaded:
+            return self
+        with self._lazy_lock:
+            params = self.__dict__.get('_pending')
+            if params is not None:
+                component = self.__class__.__new__(self.__class__)
+                component.__dict__.update(self.__dict__)
+                del component.__dict__['_pending']
+                with collecting(*self._collectors):
+                    REEformat.__init__(component, **params)
+                self.__dict__.update(component.__dict__)
+                self._pending = None
+        return self
+
+    def __getstate__(self):
+        # The lock of a lazy component is not pickled (nor copied), a new one is created
+        state = dict(self.__dict__)
+        state.pop('_lazy_lock', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if '_pending' in state:
+            self._lazy_lock = threading.Lock()
+
+    def reload(self):
+        """
+        Loads the component again from the best version of its file in the cache,
+        a lazy component just looks for it again
+        """
+        REEformat.__init__(self, lazy=not self.loaded, **self._params)
+        return self
 
-        for file_name in os.listdir(directory):
-            for pfx in prefixes:
-                if fnmatch.fnmatch(file_name, '%s_*[0189]' % pfx):
-                    os.unlink(directory + '/' + file_name)
+    def __getattr__(self, name):
+        # The data of a lazy component is loaded on first use
+        if name in self.lazy_fields and not self.loaded:
+            self.resolve()
+            return getattr(self, name)
+        raise AttributeError(name)
 
-    def download(self, filename):
-        if not self.token:
-            raise ValueError('No ESIOS Token')
-        name = re.split('_', filename)[-3]
-        version = re.split('_', filename)[-4]
+    def _load_snapshot(self, entry, tariff=None):
+        """
+        Loads the snapshot of the component parsed from the cached file, if it is up to date
 
-        # Try to review all available versions //to set an iteriational limit
-        count_of_versions = len(self.version_order)
-        for current_version in range(count_of_versions):
-            try:
-                start_date = datetime.strptime(filename[-17:-9], "%Y%m%d")
-                end_date = datetime.strptime(filename[-8:], "%Y%m%d")
+        :return: True if loaded
+        """
+        path = self._CACHE.snapshot_path(entry.filename, tariff or '')
+        if not self.snapshots or not os.path.isfile(path):
+            return False
+        # Read, not mapped: a mapping would keep a file open for every component
+        header, matrix = read_snapshot(path)
+        if header.get('fetched_at') != entry.fetched_at:
+            return False
+        for field in self.request_fields:
+            header.pop(field, None)
+        with metrics.timer('load'):
+            self.apply_snapshot(header, matrix, storage=self.storage)
+        metrics.count('snapshot_hits')
+        self.origin = 'cache'
+        return True
+
+    def _save_snapshot(self, tariff=None):
+        """
+        Saves the snapshot of the component parsed from a cached file
+        """
+        if not self.snapshots or self.origin == 'file':
+            return
+        entry = self._CACHE.get(self.filename)
+        if entry is not None:
+            self.fetched_at = entry.fetched_at
+            self.save_snapshot(self._CACHE.snapshot_path(entry.filename, tariff or ''))
+
+    @classmethod
+    def fetch(cls, *args, **kwargs):
+        """
+        Awaitable constructor, builds the instance without blocking the event loop
 
-                e = Esios(self.token)
-                zdata = e.liquicomun().download(start_date, end_date, next=current_version)
+        `await Perdida.fetch(**params)`
+        """
+        from .aio import fetch
+        return fetch(cls, *args, **kwargs)
 
-                if zdata:
-                    c = BytesIO(zdata)
+    def known_versions(self, period):
+        """
+        Reads the version manifest of the period, refreshing the no_cache versions after _CACHE_TIMEOUT
 
-                    with zipfile.ZipFile(c) as zf:
-                        files_inside_zip = zf.namelist()
+        :param period: 'YYYYMMDD_YYYYMMDD'
+        :return: ({next: version}, number of `next` offsets to probe)
+        """
+        now = time.time()
+        manifest = self._CACHE.versions(period)
+        # Nothing newer than the first version can be published
+        final = manifest.get(0, ('', 0))[0] == self.version_order[0]
+        offsets = {}
+        count_of_versions = len(self.version_order)
+        for next_version, (version, checked_at) in manifest.items():
+            fresh = now - checked_at < self._CACHE_TIMEOUT
+            if version == END_OF_VERSIONS:
+                if final or fresh:
+                    count_of_versions = min(count_of_versions, next_version)
+            elif version not in self.no_cache or fresh:
+                offsets[next_version] = version
+        return offsets, count_of_versions
 
-                        version = files_inside_zip[0][:2]
-                        expected_filename = version + filename[2:]
+    @staticmethod
+    def set_cache_dir(directory):
+        """
+        Sets the directory of the cache shared by all the formats
+        """
+        REEformat._CACHE_DIR = directory
 
-                        try:
-                            # Assert that the expected file is contained in the zip. If not raise to iterate the next
-                            assert expected_filename in files_inside_zip, "File '{}' is not inside the zip".format(
-                                expected_filename)
+    @staticmethod
+    def cache_entries(file_tmpl=None, subsystem=None, period=None, version=None):
+        """
+        Lists the cached files matching the passed filters
+        :param period: 'YYYYMMDD_YYYYMMDD'
+        :return: list of CacheEntry
+        """
+        return REEformat._CACHE.entries(file_tmpl=file_tmpl, subsystem=subsystem, period=period, version=version)
 
-                            zf.extractall("/tmp/liquicomun" + str(start_date))
-                            # Open the needed file inside the Zip
-                            with zf.open(expected_filename, "r") as fdata:
-                                # Load the CSV
-                                textfile = TextIOWrapper(fdata)
-                                reereader = csv.reader(textfile, delimiter=';')
+    @staticmethod
+    def invalidate_cache(file_tmpl=None, subsystem=None, period=None, version=None):
+        """
+        Removes the cached files matching the passed filters
+        :return: number of removed files
+        """
+        return REEformat._CACHE.invalidate(file_tmpl=file_tmpl, subsystem=subsystem, period=period, version=version)
 
-                                # Extract the rows list using the the csv reader
-                                rows = [row for row in reereader]
+    @staticmethod
+    def clear_cache(version=''):
+        """
+        :param version: Cn or An prefix. All if empty
+        """
+        REEformat.invalidate_cache(version=version or None)
+        REEformat._CACHE.forget_versions(version=version or None)
+        REEformat._ARCHIVES.clear(version)
 
-                                # Extract current file to disk to keep a CACHE version
-                                zf.extract(member=expected_filename, path=self._CACHE_DIR)
+    def download(self, filename):
+        with self._locate(filename)() as stream:
+            return [row for row in csv.reader(stream, delimiter=';')]
 
-                                self.filename = expected_filename
-                                return rows
+    def download_using_coeffs(self, filename):
+        return self.download(filename)
 
-                        except KeyError:
-                            logging.debug(
-                                "Exception opening expected_filename '{}' inside zip".format(expected_filename))
+    def _locate(self, filename, keep_filename=False):
+        """
+        Finds the file inside the liquicomun archives of its period.
 
-                else:
-                    logging.debug("No valid data has been downloaded")
+        Every archive is downloaded once and all its members are indexed
+        in the cache, so all the files of the period are served from it
 
-            except Exception as e:
-                logging.debug("Exception processing download [{}]".format(e))
+        :param keep_filename: do not set the found file as the instance filename
+        :return: function that opens the found file as a text stream
+        """
+        if not self.token and self.client is None:
+            raise ValueError('No ESIOS Token')
 
-        # If the iteration do not return anything for all available tests, rasise an error
-        logging.error('Requested coeficients from REE not found for {}'.format(filename))
-        raise ValueError('Requested coeficients from REE not found')
+        with metrics.timer('probe'):
+            return self._probe(filename, keep_filename)
 
-    def download_using_coeffs(self, filename):
-        if not self.token:
-            raise ValueError('No ESIOS Token')
-        # name = re.split('_', filename)[-3]
-        # version = re.split('_', filename)[-4]
+    def _probe(self, filename, keep_filename=False):
+        start_date = datetime.strptime(filename[-17:-9], "%Y%m%d")
+        end_date = datetime.strptime(filename[-8:], "%Y%m%d")
 
         # Try to review all available versions //to set an iteriational limit
-        count_of_versions = len(self.version_order)
+        offsets, count_of_versions = self.known_versions(filename[-17:])
         for current_version in range(count_of_versions):
             try:
-                start_date = datetime.strptime(filename[-17:-9], "%Y%m%d")
-                end_date = datetime.strptime(filename[-8:], "%Y%m%d")
-
-                e = Esios(self.token)
-                zdata = e.liquicomun().download(start_date, end_date, next=current_version)
-
-                if zdata:
-                    c = BytesIO(zdata)
-
-                    with zipfile.ZipFile(c) as zf:
-                        files_inside_zip = zf.namelist()
-
-                        version = files_inside_zip[0][:2]
-                        expected_filename = version + filename[2:]
-
-                        try:
-                            # Assert that the expected file is contained in the zip. If not raise to iterate the next
-                            assert expected_filename in files_inside_zip, "File '{}' is not inside the zip".format(
-                                expected_filename)
-
-                            zf.extractall("/tmp/liquicomun" + str(start_date))
-                            # Open the needed file inside the Zip
-                            with zf.open(expected_filename, "r") as fdata:
-                                # Load the CSV
-                                textfile = TextIOWrapper(fdata)
-                                reereader = csv.reader(textfile, delimiter=';')
-
-                                # Extract the rows list using the the csv reader
-                                rows = [row for row in reereader]
-
-                                # Extract current file to disk to keep a CACHE version
-                                zf.extract(member=expected_filename, path=self._CACHE_DIR)
-
-                                self.filename = expected_filename
-                                return rows
-
-                        except KeyError:
-                            logging.debug("Exception opening expected_filename '{}' inside zip".format(
-                                expected_filename))
-
-                else:
-                    logging.debug("No valid data has been downloaded")
-
+                archive = self._ARCHIVES.fetch(
+                    self.token, start_date, end_date, next=current_version, version=offsets.get(current_version),
+                    client=self.client,
+                )
+
+                if archive is not None:
+                    expected_filename = archive.version + filename[2:]
+
+                    # Assert that the expected file is contained in the zip. If not raise to iterate the next
+                    assert expected_filename in archive, "File '{}' is not inside the zip".format(
+                        expected_filename)
+
+                    if not keep_filename:
+                        self.filename = expected_filename
+                    return functools.partial(archive.open, expected_filename)
+
+            except VersionNotAvailable:
+                break
+            except EsiosError:
+                # Unreachable ESIOS, the next versions would fail too
+                raise
             except Exception as e:
                 logging.debug("Exception processing download [{}]".format(e))
 
@@ -302,78 +496,69 @@ class REEformat(Component):
         logging.error('Requested coeficients from REE not found for {}'.format(filename))
         raise ValueError('Requested coeficients from REE not found')
 
-    def check_data(self, rows):
-        if not rows:
-            raise ValueError('Empty File')
-        # 2 header + 28-31 days + 1 footer = 31-34 rows
-        if len(rows) not in [31, 32, 33, 34]:
-            raise ValueError('Bad %s file format' % self.name)
-
-        if len(rows[0]) < 2 or len(rows[0]) > 2 or not rows[0][0].startswith(self.name[:4]):
-            raise ValueError('Bad %s file format' % self.name)
-
-        if rows[-1][0] != '*':
-            raise ValueError('Bad %s file format' % self.name)
-
-    def check_data_using_coeffs(self, rows):
-        self.check_data_without_file_name(rows)
-
-        if len(rows[0]) < 2 or len(rows[0]) > 2 or not rows[0][0].startswith(self.name[:4]):
-            raise ValueError('Bad %s file format' % self.name)
-
-    def check_data_without_file_name(self, rows):
-        if not rows:
-            raise ValueError('Empty File')
-        # 2 header + 28-31 days + 1 footer = 31-34 rows
-        if len(rows) not in [31, 32, 33, 34]:
-            raise ValueError('Bad %s file format' % self.name)
-
-        if len(rows[0]) < 2 or len(rows[0]) > 2:
-            raise ValueError('Bad %s file format' % self.name)
-
-        if rows[-1][0] != '*':
-            raise ValueError('Bad %s file format' % self.name)
-
-    def format_data(self, rows):
-        # formats data as 25 * num days matrix
-        return [[v and float(v) or 0.0 for v in r[1:26]] for r in rows[2:-1]]
-
-    def format_data_using_coeffs(self, rows, periodstable, tariff):
-        # formats data as 25 * num days matrix
-        matrix = []
-        y = 1
-        for r in rows[2:-1]:
-            y += 1
-            row = []
-            x = 0
-            for k in r[1:26]:
-                x += 1
-                period = periodstable[y][x]
-                if period:
-                    loss = k and float(k) * LOSS_COEFF_BOE[tariff][period]
-                else:
-                    loss = 0.0
-                row.append(round(loss, 1) or 0.0)
-            matrix.append(row)
-        return matrix
+    def loadstream(self, stream):
+        """
+        Parses the file stream straight into the matrix
+        """
+        with metrics.timer('validation'):
+            reader = REEReader(stream, self.name)
+        filedate = datetime.strptime(self.filename[-8:], '%Y%m%d')
 
-    def loadfile(self, rows):
-        self.check_data(rows)
+        super(REEformat, self).__init__(data=filedate, version=reader.version)
+        with metrics.timer('parse'):
+            reader.read_into(self.matrix, self.num_days)
 
-        version = ''.join(rows[1][:6])
+    def load_using_coeffs(self, source, periods_source, tariff, reads=None, periods_key=None):
+        """
+        Parses the K file and the periods table and loads the losses of the tariff
+
+        :param source: function that opens the K file as a text stream
+        :param periods_source: function that opens the periods table as a text stream
+        :param reads: {file name: (version, values)} of the already parsed files, updated with the new ones
+        :param periods_key: name of the periods table in `reads`
+        """
+        if reads is None:
+            reads = {}
         filedate = datetime.strptime(self.filename[-8:], '%Y%m%d')
 
-        super(REEformat, self).__init__(data=filedate, version=version)
-        data = self.format_data(rows)
-        self.load(data)
+        super(REEformat, self).__init__(data=filedate)
+        version, coeffs = self._read_values(source, self.filename, reads)
+        periods = self._read_values(periods_source, periods_key, reads, check_name=False, dtype=np.int8)[1]
+        self.version = version
+        with metrics.timer('load'):
+            self.load(self.losses_using_coeffs(coeffs, periods, tariff))
 
-    def loadfile_using_coeffs(self, rows, periodstable, tariff):
-        self.check_data_using_coeffs(rows)
-        self.check_data_without_file_name(periodstable)
+    def _read_values(self, source, key, reads, check_name=True, dtype=np.float64):
+        """
+        Returns the (version, num_days x 25 read only values) of the file, parsing it only if not in `reads`
+        """
+        if key is not None and key in reads:
+            return reads[key]
+        with source() as stream:
+            with metrics.timer('validation'):
+                reader = REEReader(stream, self.name, check_name=check_name)
+            with metrics.timer('parse'):
+                if np.issubdtype(dtype, np.integer):
+                    values = reader.read_into(np.zeros((self.num_days, 25), dtype=dtype), self.num_days, int, 0)
+                else:
+                    values = reader.read_into(np.zeros((self.num_days, 25), dtype=dtype), self.num_days)
+        values.setflags(write=False)
+        if key is not None:
+            reads[key] = (reader.version, values)
+        return reader.version, values
 
-        version = ''.join(rows[1][:6])
-        filedate = datetime.strptime(self.filename[-8:], '%Y%m%d')
+    def losses_using_coeffs(self, coeffs, periods, tariff):
+        """
+        Returns the losses of the tariff as a num_days x 25 array
 
-        super(REEformat, self).__init__(data=filedate, version=version)
-        data = self.format_data_using_coeffs(rows, periodstable, tariff)
-        self.load(data)
+        :param coeffs: K matrix
+        :param periods: tariff period of every hour, 0 if none
+        """
+        table = loss_coeffs_table(tariff)
+        periods = np.asarray(periods, dtype=np.intp)
+        if periods.size and (periods.min() < 0 or periods.max() >= len(table)):
+            raise ValueError('Bad %s periods for tariff %s' % (self.name, tariff))
+        loss_coeffs = table[periods]
+        if np.isnan(loss_coeffs).any():
+            raise ValueError('Bad %s periods for tariff %s' % (self.name, tariff))
+        return round_values(coeffs * loss_coeffs, 1)
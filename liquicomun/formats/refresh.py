@@ -0,0 +1,123 @@
+"""
+Incremental refresh of the versions of already loaded components.
+
+REE publishes new versions of every period over time (A1, A2, C2, ..., C7).
+Components are grouped by period, the newest available version of every
+period is looked up once and only the components with an older version are
+loaded again, from the newly downloaded archive.
+"""
+from collections import namedtuple, OrderedDict
+from datetime import datetime
+
+import time
+
+from .archive import VersionNotAvailable
+from .perdidas import PerdidaSeries
+from .ree import REEformat
+from liquicomun import metrics
+
+VersionChange = namedtuple('VersionChange', ['component', 'old_version', 'new_version'])
+VersionChange.__doc__ = """
+A refreshed component and the file versions it moved from and to
+"""
+
+
+def version_rank(version, version_order=REEformat.version_order):
+    """
+    Position of the version in version_order, 0 is the newest. Unknown versions are the oldest
+    """
+    try:
+        return version_order.index(version)
+    except ValueError:
+        return len(version_order)
+
+
+def latest_version(period, client=None, token=None, max_age=None):
+    """
+    Returns the newest version that ESIOS serves for the period, None if there is none.
+
+    The EsiosClient just lists the archives. With other clients the version recorded
+    in the version manifest is trusted for `max_age` seconds, otherwise the best
+    archive is downloaded, and it is stored and indexed in the cache
+
+    :param period: 'YYYYMMDD_YYYYMMDD'
+    :param max_age: REEformat._CACHE_TIMEOUT by default
+    """
+    start_date = datetime.strptime(period[:8], '%Y%m%d')
+    end_date = datetime.strptime(period[-8:], '%Y%m%d')
+    if hasattr(client, 'archives'):
+        archives = client.archives(start_date, end_date)
+        return archives and archives[0]['name'][:2] or None
+    if max_age is None:
+        max_age = REEformat._CACHE_TIMEOUT
+    version, checked_at = REEformat._CACHE.versions(period).get(0, (None, 0))
+    if version and time.time() - checked_at < max_age:
+        return version
+    try:
+        archive = REEformat._ARCHIVES.fetch(token or REEformat.token, start_date, end_date, next=0, client=client)
+    except VersionNotAvailable:
+        return None
+    return archive and archive.version
+
+
+def _refreshable(components):
+    """
+    Yields the components loaded from ESIOS files, the months of the series too
+    """
+    for component in components:
+        if isinstance(component, PerdidaSeries):
+            for month in _refreshable(component.losses):
+                yield month
+        elif component is not None and '_params' in component.__dict__:
+            # Not the ones loaded from local files
+            if component.__dict__.get('origin') != 'file':
+                yield component
+
+
+def refresh_versions(components, client=None, token=None, max_age=None):
+    """
+    Loads again the components with a newer version available, in place
+
+    Components of the final version are skipped. Only the periods with an outdated component
+    are downloaded again (or just listed with an EsiosClient), and the manifest of their
+    versions is renewed.
+
+    :param components: loaded (or lazy) REE components, i.e. Perdida, Prmdiari or PerdidaSeries. None are skipped
+    :param client: ESIOS client, the one of every component (or a new Esios) by default
+    :param max_age: seconds the newest version recorded for a period is trusted, see latest_version.
+        0 looks for it again
+    :return: list of VersionChange of the components that moved to a newer version
+    """
+    periods = OrderedDict()
+    for component in _refreshable(components):
+        if component.file_version != component.version_order[0]:
+            periods.setdefault(component.filename[-17:], []).append(component)
+
+    changes = []
+    for period, group in periods.items():
+        group_client = client or group[0].client
+        newest = latest_version(period, group_client, token or group[0].token, max_age)
+        if newest is None:
+            continue
+        outdated = [
+            component for component in group
+            if version_rank(newest, component.version_order) <
+            version_rank(component.file_version, component.version_order)
+        ]
+        if not outdated:
+            continue
+        # The offsets of the known versions moved
+        REEformat._CACHE.forget_versions(period=period)
+        archive = REEformat._ARCHIVES.fetch(
+            token or group[0].token, datetime.strptime(period[:8], '%Y%m%d'),
+            datetime.strptime(period[-8:], '%Y%m%d'), next=0, version=newest, client=group_client
+        )
+        if archive is not None:
+            REEformat._CACHE.record_version(period, 0, archive.version)
+        for component in outdated:
+            old_version = component.file_version
+            component.reload()
+            if component.file_version != old_version:
+                metrics.count('refreshes')
+                changes.append(VersionChange(component, old_version, component.file_version))
+    return changes
@@ -0,0 +1,63 @@
+"""
+Binary snapshot of a parsed component:
+
+- magic: b'LQCSNAP1'
+- header length: little-endian uint32
+- header: utf-8 JSON with the component metadata, padded to 16 bytes
+- data: little-endian float64 matrix (num_days x 25), C order
+"""
+import os
+import json
+import struct
+import threading
+
+import numpy as np
+
+MAGIC = b'LQCSNAP1'
+DTYPE = np.dtype('<f8')
+ALIGNMENT = 16
+
+
+def write_snapshot(path, header, matrix):
+    """
+    Writes the snapshot atomically
+
+    :param header: JSON serializable dict
+    :param matrix: num_days x 25 values
+    """
+    values = np.ascontiguousarray(matrix, dtype=DTYPE)
+    header = dict(header, shape=list(values.shape))
+    encoded = json.dumps(header, sort_keys=True).encode('utf-8')
+    prefix_len = len(MAGIC) + 4
+    padding = -(prefix_len + len(encoded)) % ALIGNMENT
+    encoded += b' ' * padding
+
+    # Unique in every thread of every process writing the same snapshot
+    tmp_path = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.current_thread().ident)
+    with open(tmp_path, 'wb') as snapshot:
+        snapshot.write(MAGIC)
+        snapshot.write(struct.pack('<I', len(encoded)))
+        snapshot.write(encoded)
+        snapshot.write(values.tobytes())
+    os.rename(tmp_path, path)
+
+
+def read_snapshot(path, mmap=False):
+    """
+    Reads a snapshot, the file is closed when read
+
+    :param mmap: memory map the data (copy on write) instead of reading it. The mapping keeps the file open
+    :return: (header, matrix)
+    """
+    with open(path, 'rb') as snapshot:
+        if snapshot.read(len(MAGIC)) != MAGIC:
+            raise ValueError('Bad snapshot file {}'.format(path))
+        header_len = struct.unpack('<I', snapshot.read(4))[0]
+        header = json.loads(snapshot.read(header_len).decode('utf-8'))
+        offset = len(MAGIC) + 4 + header_len
+        shape = tuple(header.pop('shape'))
+        if mmap:
+            matrix = np.memmap(path, dtype=DTYPE, mode='c', offset=offset, shape=shape)
+        else:
+            matrix = np.fromfile(snapshot, dtype=DTYPE, count=shape[0] * shape[1]).reshape(shape)
+    return header, matrix
@@ -0,0 +1,143 @@
+"""
+Instrumentation of the fetch and parse stages.
+
+Events are recorded in the global REGISTRY and in every registry being
+collected by the current thread (see `collecting`), so a Perdida keeps
+the metrics of its own load and Perdidas the ones of all its losses:
+
+- counters: cache_hits, cache_misses, snapshot_hits, probes, downloads, refreshes
+- timings (seconds): probe, download, unzip, validation, parse, load
+"""
+import json
+import threading
+from contextlib import contextmanager
+from timeit import default_timer
+
+
+class Metrics(object):
+    """
+    Registry of counters and timings.
+
+    Hooks are called as hook(kind, name, value) on every recorded event,
+    kind being 'counter' or 'timing'
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        # name -> [count, total seconds, max seconds]
+        self.timings = {}
+        self.hooks = []
+
+    def __getstate__(self):
+        # Locks and hooks are not copied, i.e. to pickle the components and send them to other processes
+        with self.lock:
+            return {'counters': dict(self.counters), 'timings': dict(self.timings)}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.counters = state['counters']
+        self.timings = state['timings']
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        for hook in self.hooks:
+            hook('counter', name, value)
+
+    def observe(self, name, seconds):
+        with self.lock:
+            timing = self.timings.setdefault(name, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+        for hook in self.hooks:
+            hook('timing', name, seconds)
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.timings = {}
+
+    def as_dict(self):
+        """ {'counters': {name: value}, 'timings': {name: {'count', 'total', 'max'}}} """
+        with self.lock:
+            return {
+                'counters': dict(self.counters),
+                'timings': dict(
+                    (name, {'count': count, 'total': total, 'max': maximum})
+                    for name, (count, total, maximum) in self.timings.items()
+                ),
+            }
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), sort_keys=True)
+
+    def to_prometheus(self, prefix='liquicomun'):
+        """ Prometheus text exposition format, timings as summaries """
+        metrics = self.as_dict()
+        lines = []
+        for name, value in sorted(metrics['counters'].items()):
+            metric = '{}_{}_total'.format(prefix, name)
+            lines.append('# TYPE {} counter'.format(metric))
+            lines.append('{} {}'.format(metric, value))
+        for name, timing in sorted(metrics['timings'].items()):
+            metric = '{}_{}_seconds'.format(prefix, name)
+            lines.append('# TYPE {} summary'.format(metric))
+            lines.append('{}_count {}'.format(metric, timing['count']))
+            lines.append('{}_sum {!r}'.format(metric, timing['total']))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Metrics()
+
+_local = threading.local()
+
+
+def _registries():
+    return [REGISTRY] + getattr(_local, 'collecting', [])
+
+
+def active():
+    """ Registries being collected by the current thread, but the global one """
+    return list(getattr(_local, 'collecting', []))
+
+
+@contextmanager
+def collecting(*registries):
+    """ Records the events of the current thread in the registries too """
+    stack = getattr(_local, 'collecting', None)
+    if stack is None:
+        stack = _local.collecting = []
+    added = [registry for registry in registries if registry not in stack]
+    stack.extend(added)
+    try:
+        yield
+    finally:
+        for registry in added:
+            stack.remove(registry)
+
+
+def count(name, value=1):
+    for registry in _registries():
+        registry.count(name, value)
+
+
+def observe(name, seconds):
+    for registry in _registries():
+        registry.observe(name, seconds)
+
+
+@contextmanager
+def timer(name):
+    """ Records the duration of the block, even if it raises """
+    start = default_timer()
+    try:
+        yield
+    finally:
+        observe(name, default_timer() - start)
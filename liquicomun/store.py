@@ -0,0 +1,259 @@
+"""
+Multi-year store of components.
+
+Every (component type, tariff, subsystem) series is a single memory mapped
+float64 file with one row of 25 hours per day, indexed by day from the
+first stored month. Range queries return zero-copy slices of the mapping.
+"""
+import os
+import json
+import threading
+from datetime import date, datetime
+
+import numpy as np
+
+from .formats.component import Component
+
+DTYPE = np.dtype('<f8')
+HOURS = 25
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, '%Y%m%d').date()
+
+
+def _month_start(year, month):
+    return date(year, month, 1)
+
+
+def _next_month(year, month):
+    return year + month // 12, month % 12 + 1
+
+
+class Series(object):
+    """
+    Days x 25 hours float64 file with its index:
+
+    - data.f8: raw matrix, days without data are NaN
+    - index.json: first day, number of days and metadata of every month
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.data_path = os.path.join(directory, 'data.f8')
+        self.index_path = os.path.join(directory, 'index.json')
+        self.lock = threading.RLock()
+        self._matrix = None
+        if os.path.isfile(self.index_path):
+            with open(self.index_path) as index:
+                self.index = json.load(index)
+        else:
+            self.index = {'start': None, 'days': 0, 'months': {}}
+
+    @property
+    def start(self):
+        return self.index['start'] and _as_date(self.index['start'])
+
+    @property
+    def days(self):
+        return self.index['days']
+
+    @property
+    def end(self):
+        """ Last stored day """
+        if not self.days:
+            return None
+        return date.fromordinal(self.start.toordinal() + self.days - 1)
+
+    @property
+    def months(self):
+        """ {'YYYYMM': metadata} of the stored months """
+        return self.index['months']
+
+    @property
+    def matrix(self):
+        """ Read only memory mapped days x 25 matrix """
+        with self.lock:
+            if self._matrix is None and self.days:
+                self._matrix = np.memmap(self.data_path, dtype=DTYPE, mode='r', shape=(self.days, HOURS))
+            return self._matrix
+
+    def copy_on_write(self, first, last):
+        """
+        Memory mapped [first, last) rows that can be changed, the changes are kept
+        in memory and never written to the file
+        """
+        with self.lock:
+            return np.memmap(
+                self.data_path, dtype=DTYPE, mode='c', offset=first * HOURS * DTYPE.itemsize,
+                shape=(last - first, HOURS),
+            )
+
+    def offset(self, day):
+        return _as_date(day).toordinal() - self.start.toordinal()
+
+    def bounds(self, start=None, end=None):
+        """
+        Returns the [first, last) rows of the days between start and end (included)
+        """
+        first = 0
+        last = self.days
+        if start is not None:
+            first = min(max(self.offset(start), 0), self.days)
+        if end is not None:
+            last = min(max(self.offset(end) + 1, first), self.days)
+        return first, max(first, last)
+
+    def write(self, year, month, values, metadata):
+        """
+        Stores the month values, growing (or rebasing) the file if needed
+        """
+        with self.lock:
+            first = _month_start(year, month)
+            last = _month_start(*_next_month(year, month))
+            start = self.start
+            if start is None:
+                start = first
+                if not os.path.isdir(self.directory):
+                    os.makedirs(self.directory)
+            end = self.days and date.fromordinal(start.toordinal() + self.days) or first
+            new_start = min(start, first)
+            new_end = max(end, last)
+            days = new_end.toordinal() - new_start.toordinal()
+
+            if new_start != start or days != self.days:
+                self._resize(new_start, days)
+
+            offset = first.toordinal() - new_start.toordinal()
+            matrix = np.memmap(self.data_path, dtype=DTYPE, mode='r+', shape=(days, HOURS))
+            matrix[offset:offset + len(values)] = values
+            matrix.flush()
+            del matrix
+
+            self.index['months']['{:04d}{:02d}'.format(year, month)] = metadata
+            self._save_index()
+
+    def _resize(self, new_start, days):
+        """ Rewrites the data file to hold `days` days from `new_start` """
+        self._matrix = None
+        shift = self.days and self.start.toordinal() - new_start.toordinal() or 0
+        tmp_path = self.data_path + '.tmp'
+        resized = np.memmap(tmp_path, dtype=DTYPE, mode='w+', shape=(days, HOURS))
+        resized[:] = np.nan
+        if self.days:
+            current = np.memmap(self.data_path, dtype=DTYPE, mode='r', shape=(self.days, HOURS))
+            resized[shift:shift + self.days] = current
+            del current
+        resized.flush()
+        del resized
+        os.rename(tmp_path, self.data_path)
+        self.index['start'] = new_start.strftime('%Y%m%d')
+        self.index['days'] = days
+
+    def _save_index(self):
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as index:
+            json.dump(self.index, index, sort_keys=True)
+        os.rename(tmp_path, self.index_path)
+
+
+class ComponentStore(object):
+    """
+    Packs many months of components in one memory mapped series per
+    (component type, tariff, subsystem):
+
+    store = ComponentStore('/path/to/store')
+    for a_loss in Perdidas(...):
+        store.add(a_loss)
+    store.get('perdida', '30TD', 'baleares', '20210101', '20251231')  # days x 25 view
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.series = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(component, kind=None, tariff=None, subsystem=None):
+        """ (component type, tariff, subsystem) of the component """
+        return (
+            kind or component.__class__.__name__.lower(),
+            tariff or getattr(component, 'tariff', '') or '',
+            subsystem or getattr(component, 'subsystem', '') or '',
+        )
+
+    def get_series(self, kind, tariff='', subsystem=''):
+        key = (kind, tariff, subsystem)
+        with self.lock:
+            if key not in self.series:
+                path = os.path.join(self.directory, *[part or '_' for part in key])
+                self.series[key] = Series(path)
+            return self.series[key]
+
+    def add(self, component, kind=None, tariff=None, subsystem=None):
+        """
+        Stores the component month, replacing the stored one if any
+
+        :param kind: component type, the lowercased class name by default
+        :param tariff: component tariff attribute by default
+        :param subsystem: component subsystem attribute by default
+        """
+        series = self.get_series(*self.key(component, kind, tariff, subsystem))
+        metadata = {
+            'version': component.version,
+            'file_version': getattr(component, 'file_version', ''),
+        }
+        series.write(component.year, component.month, component.as_array(), metadata)
+
+    def get(self, kind, tariff='', subsystem='', start=None, end=None):
+        """
+        Returns the days x 25 values between start and end days (included) as a read only view.
+        Days without data are NaN
+
+        :param start: date, datetime or 'YYYYMMDD'. First stored day by default
+        :param end: date, datetime or 'YYYYMMDD'. Last stored day by default
+        """
+        series = self.get_series(kind, tariff, subsystem)
+        if not series.days:
+            return np.empty((0, HOURS), dtype=DTYPE)
+        first, last = series.bounds(start, end)
+        return series.matrix[first:last]
+
+    def dates(self, kind, tariff='', subsystem='', start=None, end=None):
+        """
+        Returns the days of a `get` query as a datetime64[D] array
+        """
+        series = self.get_series(kind, tariff, subsystem)
+        if not series.days:
+            return np.empty(0, dtype='datetime64[D]')
+        first, last = series.bounds(start, end)
+        return np.datetime64(series.start, 'D') + np.arange(first, last)
+
+    def component(self, kind, tariff='', subsystem='', year=None, month=None):
+        """
+        Returns the stored month as a numpy component backed by a copy on write mapping,
+        None if not stored. The component can be changed (`set`, in place operators)
+        without changing the store, use `add` to store it again
+        """
+        series = self.get_series(kind, tariff, subsystem)
+        metadata = series.months.get('{:04d}{:02d}'.format(year, month))
+        if metadata is None:
+            return None
+        component = Component(date(year, month, 1), version=metadata['version'], storage='numpy')
+        first = series.offset(date(year, month, 1))
+        component.matrix = series.copy_on_write(first, first + component.num_days)
+        component.file_version = metadata['file_version']
+        return component
+
+    def keys(self):
+        """ Lists the stored (component type, tariff, subsystem) series """
+        result = []
+        if not os.path.isdir(self.directory):
+            return result
+        for kind in sorted(os.listdir(self.directory)):
+            for tariff in sorted(os.listdir(os.path.join(self.directory, kind))):
+                for subsystem in sorted(os.listdir(os.path.join(self.directory, kind, tariff))):
+                    result.append(tuple(part != '_' and part or '' for part in (kind, tariff, subsystem)))
+        return result
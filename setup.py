@@ -3,14 +3,20 @@ from setuptools import setup, find_packages
 setup(
     name='liquicomun',
     version='0.4.4',
-    packages=find_packages(),
+    packages=find_packages(exclude=['specs', 'specs.*', 'benchmarks', 'benchmarks.*']),
     url='https://github.com/gisce/liquicomun',
     license='MIT',
     install_requires=[
         'esios',
         'pytz',
         'future',
+        'numpy',
+        'requests',
+        'futures; python_version < "3"',
     ],
+    entry_points={
+        'console_scripts': ['liquicomun = liquicomun.cli:main'],
+    },
     author='GISCE-TI, S.L.',
     author_email='devel@gisce.net',
     description='Interact with REE liquicomun files',
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from liquicomun import Perdida, Perdidas
+from expects import expect, equal
+from mamba import description, context, it, before, after
+from specs.fixtures import FakeEsios, liquicomun_zip, setup_offline, teardown_offline
+
+import asyncio
+
+
+with description('asyncio interface'):
+    with before.each:
+        setup_offline(self, [liquicomun_zip('A3', '20201001', '20201031', ['20A', '30A', '31A'])])
+
+    with after.each:
+        teardown_offline(self)
+
+    with context('fetching the losses from asyncio'):
+        with it('must await the Perdida constructor'):
+            params = {'date_start': '20201001', 'date_end': '20201031', 'type_import': 'perd_files'}
+
+            async def fetch_losses():
+                return await asyncio.gather(*[
+                    Perdida.fetch(tariff=tariff, **params) for tariff in ['2.0A', '3.0A', '3.1A']
+                ])
+
+            losses = asyncio.run(fetch_losses())
+
+            expect(FakeEsios.calls).to(equal([0]))
+            expect([loss.get(1, 0) for loss in losses]).to(equal([1.0, 2.0, 3.0]))
+
+        with it('must iterate the Perdidas grid in order'):
+            losses = Perdidas(
+                date_start='20201001', date_end='20201031', tariffs=['3.1A', '2.0A', '3.0A'],
+                subsystems=['peninsula'], type_import='perd_files'
+            )
+
+            async def iterate_losses():
+                return [a_loss async for a_loss in losses]
+
+            expect([loss.tariff for loss in asyncio.run(iterate_losses())]).to(equal(['20A', '30A', '31A']))
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+from liquicomun import Perdida, Perdidas
+from liquicomun.formats import REEformat
+from expects import expect, equal, raise_error, be_true, be_false
+from mamba import description, context, it, before, after
+from specs.fixtures import FakeEsios, k_coeffs_files, liquicomun_zip, setup_offline, teardown_offline
+
+import copy
+import numpy as np
+import os
+import pickle
+import threading
+import time
+
+
+class SlowEsios(FakeEsios):
+    """ Takes a while to start every download """
+    def liquicomun(self):
+        time.sleep(0.2)
+        return super(SlowEsios, self).liquicomun()
+
+
+with description('Liquicomun archives cache'):
+    with before.each:
+        setup_offline(self, [liquicomun_zip('A3', '20201001', '20201031', ['20A', '30A', '31A'])])
+
+    with after.each:
+        teardown_offline(self)
+
+    with context('fetching many files of the same period'):
+        with it('must download the archive once'):
+            params = {'date_start': '20201001', 'date_end': '20201031', 'type_import': 'perd_files'}
+            losses = [Perdida(tariff=tariff, **params) for tariff in ['2.0A', '3.0A', '3.1A']]
+
+            expect(FakeEsios.calls).to(equal([0]))
+            expect([loss.file_version for loss in losses]).to(equal(['A3', 'A3', 'A3']))
+            expect([loss.get(1, 0) for loss in losses]).to(equal([1.0, 2.0, 3.0]))
+
+        with it('must serve the files from the stored archive'):
+            REEformat._ARCHIVES.fetch('token', datetime(2020, 10, 1), datetime(2020, 10, 31))
+            loss = Perdida(tariff='3.0A', date_start='20201001', date_end='20201031', type_import='perd_files')
+
+            expect(FakeEsios.calls).to(equal([0]))
+            expect(loss.origin).to(equal('cache'))
+            expect(loss.get(2, 1)).to(equal(2.1))
+
+    with context('fetching the losses concurrently'):
+        with it('must return the grid in iteration order downloading once'):
+            losses = Perdidas(
+                date_start='20201001', date_end='20201031', tariffs=['3.1A', '2.0A', '3.0A', '6.1A'],
+                subsystems=['peninsula'], type_import='perd_files', workers=4
+            )
+
+            fetched = losses.fetch_all()
+            iterated = list(losses)
+
+            expect(FakeEsios.calls.count(0)).to(equal(1))
+            expect([loss and loss.tariff for loss in fetched]).to(equal(['20A', '30A', '31A', None]))
+            expect([loss and loss.tariff for loss in iterated]).to(equal(['20A', '30A', '31A', None]))
+            expect([loss.get(1, 0) for loss in fetched[:3]]).to(equal([1.0, 2.0, 3.0]))
+
+    with context('the version manifest'):
+        with it('must avoid probing the known versions again'):
+            FakeEsios.archives = [
+                liquicomun_zip('C7', '20201001', '20201031', ['20A']),
+                liquicomun_zip('A7', '20201001', '20201031', ['20A', '30A']),
+            ]
+            params = {'date_start': '20201001', 'date_end': '20201031', 'type_import': 'perd_files'}
+            loss = Perdida(tariff='3.0A', **params)
+            expect(loss.file_version).to(equal('A7'))
+            expect(FakeEsios.calls).to(equal([0, 1]))
+            expect(lambda: Perdida(tariff='3.1A', **params)).to(raise_error(ValueError))
+            expect(FakeEsios.calls).to(equal([0, 1, 2]))
+
+            # a new process only knows the persisted cache
+            REEformat.set_cache_dir(self.cache_dir)
+            FakeEsios.calls = []
+            expect(lambda: Perdida(tariff='3.1A', **params)).to(raise_error(ValueError))
+            expect(FakeEsios.calls).to(equal([]))
+            expect(REEformat._CACHE.versions('20201001_20201031')[1][0]).to(equal('A7'))
+
+        with it('must refresh the expired no_cache versions'):
+            FakeEsios.archives = [liquicomun_zip('A1', '20201001', '20201031', ['20A'])]
+            params = {'date_start': '20201001', 'date_end': '20201031', 'type_import': 'perd_files'}
+            expect(lambda: Perdida(tariff='3.0A', **params)).to(raise_error(ValueError))
+            expect(FakeEsios.calls).to(equal([0, 1]))
+            expect(lambda: Perdida(tariff='3.0A', **params)).to(raise_error(ValueError))
+            expect(FakeEsios.calls).to(equal([0, 1]))
+
+            REEformat.set_cache_dir(self.cache_dir)
+            FakeEsios.calls = []
+            original_timeout = REEformat._CACHE_TIMEOUT
+            REEformat._CACHE_TIMEOUT = 0
+            try:
+                expect(lambda: Perdida(tariff='3.0A', **params)).to(raise_error(ValueError))
+            finally:
+                REEformat._CACHE_TIMEOUT = original_timeout
+            expect(FakeEsios.calls).to(equal([0, 1]))
+
+    with context('the binary snapshots'):
+        with it('must load the parsed component on warm starts'):
+            params = {'tariff': '3.0A', 'date_start': '20201001', 'date_end': '20201031', 'type_import': 'perd_files'}
+            cold = Perdida(**params)
+            warm = Perdida(**params)
+            loaded = Perdida.load_snapshot(
+                REEformat._CACHE.snapshot_path('A3_perd30A_20201001_20201031'), storage='list'
+            )
+
+            for loss in (warm, loaded):
+                expect(loss.matrix).to(equal(cold.matrix))
+                expect(loss.version).to(equal(cold.version))
+                expect(loss.file_version).to(equal('A3'))
+                expect(loss.tariff).to(equal('30A'))
+                expect((loss.year, loss.month)).to(equal((2020, 10)))
+            expect(warm.origin).to(equal('cache'))
+
+        with it('must not keep the snapshots of the warm loads open'):
+            params = {'tariff': '3.0A', 'date_start': '20201001', 'date_end': '20201031', 'type_import': 'perd_files'}
+            Perdida(storage='numpy', **params)
+            warm = Perdida(storage='numpy', **params)
+            path = REEformat._CACHE.snapshot_path('A3_perd30A_20201001_20201031')
+
+            expect(warm.metrics.as_dict()['counters'].get('snapshot_hits')).to(equal(1))
+            expect(isinstance(warm.matrix, np.memmap)).to(be_false)
+            expect(isinstance(Perdida.load_snapshot(path).matrix, np.memmap)).to(be_false)
+            expect(isinstance(Perdida.load_snapshot(path, mmap=True).matrix, np.memmap)).to(be_true)
+
+        with it('must keep the request metadata of the losses sharing a snapshot'):
+            FakeEsios.archives = [liquicomun_zip('A3', '20201001', '20201031', [], k_coeffs_files(31))]
+            params = {'tariff': '2.0TD', 'date_start': '20201001', 'date_end': '20201031', 'type_import': 'k_coeffs'}
+            fields = ('tariff', 'subsystem', 'date_start', 'date_end', 'name', 'filename', 'file_version', 'version')
+            Perdida.snapshots = False
+            try:
+                cold = dict((subsystem, Perdida(subsystem=subsystem, **params)) for subsystem in ('peninsula', 'baleares'))
+            finally:
+                del Perdida.snapshots
+            Perdida(subsystem='peninsula', **params)
+            for subsystem in ('peninsula', 'baleares'):
+                warm = Perdida(subsystem=subsystem, **params)
+
+                expect(warm.metrics.as_dict()['counters'].get('snapshot_hits')).to(equal(1))
+                expect(warm.subsystem).to(equal(subsystem))
+                expect([getattr(warm, field) for field in fields]).to(
+                    equal([getattr(cold[subsystem], field) for field in fields])
+                )
+                expect(warm.matrix).to(equal(cold[subsystem].matrix))
+
+        with it('must write them and the archives through temporary files of the process and thread'):
+            renamed = []
+            original_rename = os.rename
+
+            def rename(source, target):
+                renamed.append(os.path.basename(source))
+                original_rename(source, target)
+
+            os.rename = rename
+            try:
+                Perdida(tariff='3.0A', date_start='20201001', date_end='20201031', type_import='perd_files')
+            finally:
+                os.rename = original_rename
+
+            suffix = '{}.{}'.format(os.getpid(), threading.current_thread().ident)
+            expect(renamed).to(equal([
+                'tmp{}_liquicomun_20201001_20201031.zip'.format(suffix),
+                'A3_perd30A_20201001_20201031.lqc.{}.tmp'.format(suffix),
+            ]))
+
+        with it('must remove the snapshots of invalidated files'):
+            params = {'tariff': '3.0A', 'date_start': '20201001', 'date_end': '20201031', 'type_import': 'perd_files'}
+            Perdida(**params)
+            path = REEformat._CACHE.snapshot_path('A3_perd30A_20201001_20201031')
+            expect(os.path.isfile(path)).to(be_true)
+            REEformat.clear_cache()
+            expect(os.path.isfile(path)).to(be_false)
+
+        with it('must keep the downloads in progress when cleared'):
+            Perdida(tariff='3.0A', date_start='20201001', date_end='20201031', type_import='perd_files')
+            downloading = REEformat._ARCHIVES.path('20201101', '20201130', 'tmp1.2')
+            open(downloading, 'wb').close()
+            REEformat.clear_cache()
+
+            expect(os.listdir(REEformat._ARCHIVES.directory)).to(equal([os.path.basename(downloading)]))
+
+        with it('must move the cache when the cache directory is assigned'):
+            directory = os.path.join(self.cache_dir, 'moved')
+            REEformat._CACHE_DIR = directory
+            Perdida(tariff='3.0A', date_start='20201001', date_end='20201031', type_import='perd_files')
+
+            expect(REEformat._ARCHIVES.directory).to(equal(os.path.join(directory, 'archives')))
+            expect(os.listdir(REEformat._ARCHIVES.directory)).to(equal(['A3_liquicomun_20201001_20201031.zip']))
+
+    with context('the lazy losses'):
+        with it('must not download until the data is used'):
+            params = {'date_start': '20201001', 'date_end': '20201031', 'type_import': 'perd_files', 'lazy': True}
+            loss = Perdida(tariff='3.0A', **params)
+
+            expect(FakeEsios.calls).to(equal([]))
+            expect(loss.loaded).to(be_false)
+            expect(loss.tariff).to(equal('30A'))
+            expect(loss.get(1, 0)).to(equal(2.0))
+            expect(loss.loaded).to(be_true)
+            expect(FakeEsios.calls).to(equal([0]))
+            expect(loss.file_version).to(equal('A3'))
+
+        with it('must resolve the cached version without loading'):
+            params = {'date_start': '20201001', 'date_end': '20201031', 'type_import': 'perd_files'}
+            Perdida(tariff='2.0A', **params)
+            loss = Perdida(tariff='3.0A', lazy=True, **params)
+
+            expect(loss.file_version).to(equal('A3'))
+            expect(loss.loaded).to(be_false)
+            expect((loss + 1).get(1, 0)).to(equal(3.0))
+            expect(loss.origin).to(equal('cache'))
+
+        with it('must be loaded once by many threads'):
+            loss = Perdida(
+                tariff='3.0A', date_start='20201001', date_end='20201031', type_import='perd_files', lazy=True,
+                client=SlowEsios('token')
+            )
+            results = []
+            errors = []
+
+            def read():
+                try:
+                    results.append((loss.num_days, loss.get(1, 0), loss.file_version))
+                except Exception as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=read) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            expect(errors).to(equal([]))
+            expect(results).to(equal([(31, 2.0, 'A3')] * 4))
+            expect(FakeEsios.calls).to(equal([0]))
+
+        with it('must be pickled and copied before and after loading'):
+            params = {'date_start': '20201001', 'date_end': '20201031', 'type_import': 'perd_files'}
+            loss = list(Perdidas(tariffs=['3.0A'], subsystems=['peninsula'], lazy=True, **params))[0]
+
+            for copied in (pickle.loads(pickle.dumps(loss)), copy.deepcopy(loss)):
+                expect(copied.loaded).to(be_false)
+                expect(copied.get(1, 0)).to(equal(2.0))
+                expect(copied.loaded).to(be_true)
+            expect(loss.loaded).to(be_false)
+            loss.resolve()
+            expect(pickle.loads(pickle.dumps(loss)).matrix).to(equal(loss.matrix))
+
+        with it('must raise when the not available ones are loaded'):
+            losses = list(Perdidas(
+                date_start='20201001', date_end='20201031', tariffs=['3.0A', '6.1A'],
+                subsystems=['peninsula'], type_import='perd_files', lazy=True
+            ))
+
+            expect(FakeEsios.calls).to(equal([]))
+            expect([loss.tariff for loss in losses]).to(equal(['30A', 'g61A']))
+            expect(lambda: losses[1].matrix).to(raise_error(ValueError))
+            expect(losses[1].loaded).to(be_false)
+            expect(losses[0].total_sum).to(equal(Perdida(
+                tariff='3.0A', date_start='20201001', date_end='20201031', type_import='perd_files'
+            ).total_sum))
+
+    with context('extracting the archives'):
+        with it('must not extract them by default'):
+            archive = REEformat._ARCHIVES.fetch('token', datetime(2020, 10, 1), datetime(2020, 10, 31))
+
+            expect(os.listdir(REEformat._ARCHIVES.directory)).to(equal([os.path.basename(archive.path)]))
+
+        with it('must extract every archive once if asked to'):
+            REEformat._ARCHIVES.extract_dir = os.path.join(self.cache_dir, 'extracted')
+            archive = REEformat._ARCHIVES.fetch('token', datetime(2020, 10, 1), datetime(2020, 10, 31))
+            directory = REEformat._ARCHIVES.extract(archive)
+
+            expect(directory).to(equal(os.path.join(self.cache_dir, 'extracted', 'A3_liquicomun_20201001_20201031')))
+            expect(sorted(os.listdir(directory))).to(equal(sorted(archive.members)))
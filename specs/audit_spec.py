@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+from io import StringIO
+from liquicomun.formats import write_audit
+from liquicomun.formats.component import Component
+from expects import expect, equal, raise_error
+from mamba import description, it
+
+import numpy as np
+
+
+def audit_component(year, month, storage='numpy'):
+    component = Component(date(year, month, 1), storage=storage)
+    values = np.arange(component.num_days * 25, dtype=np.float64).reshape(component.num_days, 25) / 3.0
+    component.load(values)
+    component.file_version = 'A3'
+    return component
+
+
+with description('Audit data'):
+    with it('must keep the audit tuples'):
+        component = audit_component(2021, 1, storage='list')
+        audit_data = component.get_audit_data()
+
+        expect(len(audit_data)).to(equal(31 * 24))
+        expect(audit_data[0]).to(equal(('2021-01-01 01', 0.0, 'A3', '')))
+        expect(audit_data[25]).to(equal(('2021-01-02 02', round(26 / 3.0, 6), 'A3', '')))
+        expect(component.get_audit_data(start=3, end=4)).to(equal(audit_data[48:96]))
+
+    with it('must yield columnar chunks'):
+        chunks = list(audit_component(2021, 10).iter_audit_columns(chunk_days=7))
+
+        expect(len(chunks)).to(equal(5))
+        expect(len(chunks[-1].values)).to(equal(3 * 24 + 1))
+        expect(chunks[-1].dates[-1]).to(equal(np.datetime64('2021-10-31')))
+        expect(int(chunks[-1].hours[-1])).to(equal(25))
+        expect(chunks[0].version).to(equal('A3'))
+
+    with it('must write csv'):
+        out = StringIO()
+        count = write_audit(out, [audit_component(2021, 3), audit_component(2021, 4)], key=lambda c: [c.month])
+        lines = out.getvalue().splitlines()
+
+        expect(count).to(equal(31 * 24 - 1 + 30 * 24))
+        expect(len(lines)).to(equal(count))
+        expect(lines[1]).to(equal('3,2021-03-01 02,0.333333,A3,'))
+
+    with it('must write the PostgreSQL COPY format'):
+        out = StringIO()
+        write_audit(out, [audit_component(2021, 3)], format='copy', end=1, key=lambda c: ['a\tb', None])
+
+        expect(out.getvalue().splitlines()[1]).to(equal('a\\tb\t\\N\t2021-03-01 02\t0.333333\tA3\t'))
+        expect(lambda: write_audit(out, [], format='xls')).to(raise_error(ValueError))
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+from liquicomun.formats.archive import LiquicomunArchive
+from liquicomun.formats.cache import CacheStore, split_filename
+from expects import expect, equal, be_none
+from mamba import description, context, it, before, after
+
+import os
+import shutil
+import tempfile
+import zipfile
+
+
+def stored_archive(directory, version, files):
+    """
+    Writes a liquicomun archive with the {file_tmpl: content} files of October 2020
+    """
+    path = os.path.join(directory, '{}_liquicomun_20201001_20201031.zip'.format(version))
+    with zipfile.ZipFile(path, 'w') as zf:
+        for file_tmpl, content in files.items():
+            zf.writestr('{}_{}_20201001_20201031'.format(version, file_tmpl), content)
+    return LiquicomunArchive(path)
+
+
+with description('Cache store'):
+    with before.each:
+        self.cache_dir = tempfile.mkdtemp()
+        self.store = CacheStore(self.cache_dir)
+
+    with after.each:
+        shutil.rmtree(self.cache_dir)
+
+    with it('must split REE file names'):
+        expect(split_filename('C3_Sperd20A_BALEARES_20201001_20201031')).to(
+            equal(('Sperd20A_BALEARES', 'BALEARES', '20201001_20201031', 'C3'))
+        )
+        expect(split_filename('A1_Kreal_20201001_20201031')).to(
+            equal(('Kreal', '', '20201001_20201031', 'A1'))
+        )
+
+    with context('looking up a file'):
+        with it('must return the first available candidate'):
+            self.store.put_archive(stored_archive(self.cache_dir, 'A3', {'perd20A': 'a3'}))
+            self.store.put_archive(stored_archive(self.cache_dir, 'C2', {'perd20A': 'c2'}))
+            candidates = [v + '_perd20A_20201001_20201031' for v in ('C7', 'A3', 'C2')]
+
+            entry = self.store.lookup(candidates)
+
+            expect(entry.version).to(equal('A3'))
+            expect(entry.size).to(equal(2))
+            expect(entry.origin).to(equal('server'))
+            expect(zipfile.ZipFile(entry.path).read(entry.member)).to(equal(b'a3'))
+
+        with it('must skip expired no_cache versions'):
+            self.store.put_archive(stored_archive(self.cache_dir, 'A1', {'perd20A': 'a1'}))
+            candidates = ['A1_perd20A_20201001_20201031']
+
+            expect(self.store.lookup(candidates, no_cache=('A1', ), timeout=3600).version).to(equal('A1'))
+            expect(self.store.lookup(candidates, no_cache=('A1', ))).to(be_none)
+
+    with context('invalidating entries'):
+        with it('must remove the entries and the archives not used anymore'):
+            first = stored_archive(self.cache_dir, 'A3', {'perd20A': 'a3', 'perd30A': 'a3'})
+            second = stored_archive(self.cache_dir, 'C2', {'perd20A': 'c2'})
+            self.store.put_archive(first)
+            self.store.put_archive(second)
+
+            expect(self.store.invalidate(version='A3', file_tmpl='perd20A')).to(equal(1))
+            expect(os.path.isfile(first.path)).to(equal(True))
+            expect([e.filename for e in self.store.entries()]).to(equal([
+                'C2_perd20A_20201001_20201031', 'A3_perd30A_20201001_20201031'
+            ]))
+            expect(self.store.invalidate()).to(equal(2))
+            expect(self.store.entries()).to(equal([]))
+            expect(os.path.isfile(first.path)).to(equal(False))
+            expect(os.path.isfile(second.path)).to(equal(False))
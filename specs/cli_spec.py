@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+from liquicomun.cli import main, months_between, prefetch_month, summary_table
+from expects import expect, equal, contain, raise_error
+from mamba import description, context, it, before, after
+from specs.fixtures import FakeEsios, liquicomun_zip, setup_offline, teardown_offline
+
+import multiprocessing
+
+
+with description('liquicomun command'):
+    with before.each:
+        setup_offline(self, [liquicomun_zip('A3', '20201001', '20201031', ['20A', '30A'])])
+        self.params = {'tariffs': ['2.0A', '3.0A', '3.1A'], 'subsystems': ['peninsula']}
+
+    with after.each:
+        teardown_offline(self)
+
+    with context('expanding the months'):
+        with it('must include both ends across years'):
+            expect(months_between('202011', '202102')).to(equal(['202011', '202012', '202101', '202102']))
+            expect(months_between('202102', '202011')).to(equal([]))
+
+    with context('prefetching a month'):
+        with it('must fetch the whole grid downloading once'):
+            summary = prefetch_month('202010', type_import='perd_files', **self.params)
+
+            expect(FakeEsios.calls).to(equal([0, 1]))
+            expect(summary['losses']).to(equal(2))
+            expect(summary['missing']).to(equal(1))
+            expect(summary['versions']).to(equal(['A3']))
+            expect(summary['downloads']).to(equal(1))
+
+        with it('must hit the cache the next time'):
+            prefetch_month('202010', type_import='perd_files', **self.params)
+            summary = prefetch_month('202010', type_import='perd_files', **self.params)
+
+            expect(FakeEsios.calls).to(equal([0, 1]))
+            expect(summary['downloads']).to(equal(0))
+            expect(summary['cache_hits']).to(equal(2))
+
+    with context('the summary table'):
+        with it('must show a row per month'):
+            table = summary_table([
+                {'month': '202010', 'losses': 2, 'missing': 1, 'versions': ['A3'], 'downloads': 1,
+                 'cache_hits': 0, 'seconds': 0.5},
+                {'month': '202011', 'error': 'ESIOS down'},
+            ])
+            lines = table.splitlines()
+
+            expect(len(lines)).to(equal(3))
+            expect(lines[0].split()).to(equal(['month', 'losses', 'missing', 'versions', 'downloads', 'cache',
+                                               'hits', 'seconds']))
+            expect(lines[1].split()).to(equal(['202010', '2', '1', 'A3', '1', '0', '0.50']))
+            expect(lines[2]).to(contain('error: ESIOS down'))
+
+    with context('running prefetch in a process pool'):
+        with before.each:
+            # The workers only see the FakeEsios of the parent if they are forked
+            self.start_method = multiprocessing.get_start_method(allow_none=True)
+            multiprocessing.set_start_method('fork', force=True)
+
+        with after.each:
+            multiprocessing.set_start_method(self.start_method, force=True)
+
+        with it('must reject unknown tariffs and subsystems before starting'):
+            for option, value in (('--tariffs', '9.9A'), ('--subsystems', 'azores')):
+                expect(lambda: main([
+                    'prefetch', '--from', '202010', '--to', '202010', option, value,
+                ])).to(raise_error(SystemExit))
+            expect(FakeEsios.calls).to(equal([]))
+
+        with it('must warm the cache of the parent'):
+            code = main([
+                'prefetch', '--from', '202010', '--to', '202010', '--type', 'perd_files', '--workers', '1',
+                '--tariffs', '2.0A', '3.0A', '--subsystems', 'peninsula', '--cache-dir', self.cache_dir,
+            ])
+            summary = prefetch_month('202010', type_import='perd_files', **self.params)
+
+            expect(code).to(equal(0))
+            expect(FakeEsios.calls).not_to(contain(0))
+            expect(summary['downloads']).to(equal(0))
+
+        with it('must exit with an error status if any loss could not be prefetched'):
+            def prefetch(last, *tariffs):
+                return main([
+                    'prefetch', '--from', '202010', '--to', last, '--type', 'perd_files', '--workers', '1',
+                    '--tariffs'] + list(tariffs) + ['--subsystems', 'peninsula', '--cache-dir', self.cache_dir,
+                ])
+
+            # 3.1A is not in the archive, 202011 has no archive
+            expect(prefetch('202010', '2.0A', '3.1A')).to(equal(1))
+            expect(prefetch('202011', '2.0A')).to(equal(1))
+            expect(prefetch('202010', '2.0A')).to(equal(0))
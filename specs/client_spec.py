@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+from liquicomun import Perdida, Perdidas
+from liquicomun.formats import EsiosClient
+from liquicomun.formats.client import ArchiveNotFound, EsiosError, DeadlineExceeded
+from expects import expect, equal, raise_error
+from mamba import description, context, it, before, after
+from specs.fixtures import FakeEsios, liquicomun_zip, setup_offline, teardown_offline
+
+from io import BytesIO
+
+import requests
+
+
+class FakeResponse(object):
+    def __init__(self, status_code=200, body=None, content=b''):
+        self.status_code = status_code
+        self.body = body
+        self.content = content
+
+    def json(self):
+        return self.body
+
+    def iter_content(self, chunk_size=1):
+        for position in range(0, len(self.content), chunk_size):
+            yield self.content[position:position + chunk_size]
+
+    def close(self):
+        pass
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError('HTTP {}'.format(self.status_code))
+
+
+class FakeSession(object):
+    """ Serves the listing and the archives of a period, failing the first `failures` requests """
+    def __init__(self, archives, failures=0, status_code=503):
+        self.archives = archives
+        self.failures = failures
+        self.status_code = status_code
+        self.urls = []
+
+    def get(self, url, params=None, headers=None, timeout=None, stream=False):
+        self.urls.append(url)
+        if self.failures:
+            self.failures -= 1
+            if self.status_code is None:
+                raise requests.ConnectionError('Connection refused')
+            return FakeResponse(self.status_code)
+        if url.endswith('/archives'):
+            return FakeResponse(body={'archives': [
+                {'name': '{}_liquicomun'.format(version), 'download': {'url': '/download/{}'.format(version)}}
+                for version in self.archives
+            ] + [{'name': 'C2_other', 'download': {'url': '/other'}}]})
+        content = self.archives[url.split('/')[-1]]
+        if content is None:
+            # Listed but not published
+            return FakeResponse(404)
+        return FakeResponse(content=content)
+
+
+def client(session, **params):
+    params.setdefault('backoff', 0)
+    return EsiosClient(token='token', session=session, **params)
+
+
+with description('ESIOS client'):
+    with before.each:
+        self.start = datetime(2020, 10, 1)
+        self.end = datetime(2020, 10, 31)
+
+    with it('must download by priority listing the archives once'):
+        session = FakeSession({'A3': b'a3', 'C3': b'c3'})
+        esios = client(session)
+
+        expect(esios.liquicomun().download(self.start, self.end, next=0)).to(equal(b'c3'))
+        expect(esios.liquicomun().download(self.start, self.end, next=1)).to(equal(b'a3'))
+        expect(lambda: esios.download(self.start, self.end, next=2)).to(raise_error(AssertionError))
+        expect(session.urls.count('https://api.esios.ree.es/archives')).to(equal(1))
+
+    with it('must stream the archives to a file'):
+        esios = client(FakeSession({'A3': b'a3' * 10}))
+        esios.chunk_size = 3
+        zfile = BytesIO()
+
+        expect(esios.download_to(self.start, self.end, zfile)).to(equal(20))
+        expect(zfile.getvalue()).to(equal(b'a3' * 10))
+
+    with it('must retry the transient errors'):
+        session = FakeSession({'A3': b'a3'}, failures=2)
+        expect(client(session).download(self.start, self.end)).to(equal(b'a3'))
+
+        session = FakeSession({'A3': b'a3'}, failures=1, status_code=None)
+        expect(client(session).download(self.start, self.end)).to(equal(b'a3'))
+
+    with it('must give up after the retries or the deadline'):
+        session = FakeSession({'A3': b'a3'}, failures=5)
+        expect(lambda: client(session, retries=2).download(self.start, self.end)).to(raise_error(EsiosError))
+        expect(len(session.urls)).to(equal(3))
+
+        session = FakeSession({'A3': b'a3'}, failures=5)
+        expect(
+            lambda: client(session, backoff=10, deadline=1).download(self.start, self.end)
+        ).to(raise_error(DeadlineExceeded))
+
+        session = FakeSession({'A3': b'a3'}, failures=1, status_code=403)
+        expect(lambda: client(session).download(self.start, self.end)).to(raise_error(EsiosError))
+        expect(len(session.urls)).to(equal(1))
+
+    with it('must not retry the archives not found'):
+        session = FakeSession({'C3': None, 'A3': b'a3'})
+        esios = client(session)
+
+        expect(lambda: esios.download(self.start, self.end, next=0)).to(raise_error(ArchiveNotFound))
+        expect(len(session.urls)).to(equal(2))
+        expect(esios.download(self.start, self.end, next=1)).to(equal(b'a3'))
+
+    with context('fetching losses'):
+        with before.each:
+            setup_offline(self, [])
+
+        with after.each:
+            teardown_offline(self)
+
+        with it('must download with the passed client'):
+            session = FakeSession({'A3': liquicomun_zip('A3', '20201001', '20201031', ['20A', '30A'])})
+            esios = client(session)
+            losses = list(Perdidas(
+                date_start='20201001', date_end='20201031', tariffs=['2.0A', '3.0A'], subsystems=['peninsula'],
+                type_import='perd_files', client=esios,
+            ))
+
+            expect(FakeEsios.calls).to(equal([]))
+            expect([loss.get(1, 0) for loss in losses]).to(equal([1.0, 2.0]))
+            expect(len(session.urls)).to(equal(2))
+
+        with it('must probe the next version when an archive is not found'):
+            session = FakeSession({
+                'C3': None, 'A3': liquicomun_zip('A3', '20201001', '20201031', ['20A', '30A'])
+            })
+            loss = Perdida(
+                tariff='3.0A', date_start='20201001', date_end='20201031', type_import='perd_files',
+                client=client(session),
+            )
+
+            expect(loss.file_version).to(equal('A3'))
+            expect(loss.get(1, 0)).to(equal(2.0))
+
+        with it('must not probe more versions when ESIOS is unreachable'):
+            session = FakeSession({}, failures=10)
+            params = {'date_start': '20201001', 'date_end': '20201031', 'type_import': 'perd_files'}
+
+            expect(lambda: Perdida(tariff='3.0A', client=client(session, retries=1), **params)).to(
+                raise_error(EsiosError)
+            )
+            expect(len(session.urls)).to(equal(2))
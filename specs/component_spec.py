@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+from liquicomun.formats.component import Component
+from expects import expect, equal, be_false, be_true, raise_error
+from mamba import description, context, it, before
+
+import numpy as np
+
+
+with description('Component'):
+    with context('numpy storage'):
+        with it('must allocate a num_days x 25 float64 matrix'):
+            c = Component(date(2020, 2, 1), storage='numpy')
+            expect(c.matrix.shape).to(equal((29, 25)))
+            expect(c.matrix.dtype).to(equal(np.float64))
+            expect(c.num_days).to(equal(29))
+
+        with it('must keep get and set compatible'):
+            c = Component(date(2020, 10, 1), storage='numpy')
+            expect(c.set(3, 4, 1.5)).to(be_true)
+            expect(c.get(3, 4)).to(equal(1.5))
+            expect(c.matrix[2][4]).to(equal(1.5))
+            expect(c.set(32, 4, 1.5)).to(be_false)
+
+        with it('must operate as the list storage'):
+            a = Component(date(2020, 10, 1))
+            b = Component(date(2020, 10, 1))
+            for day in range(1, a.num_days + 1):
+                for hour in range(0, 25):
+                    a.set(day, hour, day * 0.5 + hour)
+                    b.set(day, hour, day - hour * 0.25)
+            na = Component(date(2020, 10, 1), storage='numpy')
+            nb = Component(date(2020, 10, 1), storage='numpy')
+            expect(na.load(a.matrix)).to(be_true)
+            expect(nb.load(b.matrix)).to(be_true)
+
+            expected = (a * b + a - 2) * 3 - b
+            result = (na * nb + na - 2) * 3 - nb
+            expect(result.storage).to(equal('numpy'))
+            expect(result.matrix.tolist()).to(equal(expected.matrix))
+            expect(result.total_sum).to(equal(expected.total_sum))
+
+            mixed = a + nb
+            expect(mixed.storage).to(equal('numpy'))
+            expect(mixed.matrix.tolist()).to(equal((a + b).matrix))
+            expect((1 - na).matrix.tolist()).to(equal((1 - a).matrix))
+
+        with it('must operate with a list storage operand'):
+            a = Component(date(2020, 10, 1))
+            for day in range(1, a.num_days + 1):
+                for hour in range(0, 25):
+                    a.set(day, hour, day + hour * 0.5)
+            na = Component(date(2020, 10, 1), storage='numpy')
+            na.load(a.matrix)
+
+            for result, expected in ((na + a, a + a), (na - a, a - a), (na * a, a * a), (na / a, a / a)):
+                expect(result.storage).to(equal('numpy'))
+                expect(result.matrix.tolist()).to(equal(expected.matrix))
+
+        with it('must refuse to operate different months'):
+            a = Component(date(2020, 10, 1), storage='numpy')
+            b = Component(date(2020, 11, 1), storage='numpy')
+            expect(a + b).to(be_false)
+
+        with it('must refuse to load a bad shaped matrix'):
+            c = Component(date(2020, 10, 1), storage='numpy')
+            expect(c.load([[0] * 25] * 30)).to(be_false)
+
+        with it('must reject an unknown storage'):
+            expect(lambda: Component(date(2020, 10, 1), storage='dict')).to(raise_error(ValueError))
+
+        with it('must set every attribute of the arithmetic results'):
+            c = Component(date(2020, 10, 1), storage='numpy')
+            for result in (c + 1, c * c, 2 - c, Component.evaluate('a / 2', a=c), Component(date(2020, 10, 1)) + 1):
+                expect(result.file_version).to(equal(''))
+                expect((result.year, result.month, result.num_days)).to(equal((2020, 10, 31)))
+
+    with context('in place operations'):
+        with it('must update the same component with both storages'):
+            for storage in ('list', 'numpy'):
+                a = Component(date(2020, 10, 1), storage=storage)
+                b = Component(date(2020, 10, 1), storage=storage)
+                a.load([[2.0] * 25] * 31)
+                b.load([[4.0] * 25] * 31)
+                same = a
+
+                a += b
+                a *= 3
+                a -= 2
+                a /= b
+
+                expect(a is same).to(be_true)
+                expect(a.get(31, 24)).to(equal(4.0))
+
+        with it('must replace a read only matrix'):
+            a = Component(date(2020, 10, 1), storage='numpy')
+            a.matrix.flags.writeable = False
+            a += 1
+            expect(a.get(1, 0)).to(equal(1.0))
+
+        with it('must refuse different months'):
+            a = Component(date(2020, 10, 1), storage='numpy')
+            a += Component(date(2020, 11, 1), storage='numpy')
+            expect(a).to(be_false)
+
+        with it('must divide'):
+            a = Component(date(2020, 10, 1))
+            a.load([[2.0] * 25] * 31)
+            expect((a / 4).get(1, 0)).to(equal(0.5))
+            expect((1 / a).get(1, 0)).to(equal(0.5))
+            expect((a / a).total_sum).to(equal(31 * 25))
+
+    with context('evaluating expressions'):
+        with before.each:
+            self.a = Component(date(2020, 10, 1), storage='numpy')
+            self.b = Component(date(2020, 10, 1))
+            self.a.load([[day * 1.0] * 25 for day in range(1, 32)])
+            self.b.load([[10.0] * 25] * 31)
+
+        with it('must compute as the operators without changing the operands'):
+            result = Component.evaluate('a * (1 + b / 100) - -c / 2', a=self.a, b=self.b, c=3)
+            expected = self.a * (1 + self.b / 100) + 1.5
+
+            expect(result.storage).to(equal('numpy'))
+            expect(result.matrix.tolist()).to(equal(expected.matrix.tolist()))
+            expect(self.a.get(2, 0)).to(equal(2.0))
+            expect(self.b.get(2, 0)).to(equal(10.0))
+
+        with it('must return a new matrix for a single operand'):
+            result = Component.evaluate('a', a=self.a)
+            result.set(1, 0, 5.0)
+            expect(self.a.get(1, 0)).to(equal(1.0))
+
+        with it('must reject invalid expressions and operands'):
+            for expression in ('a ** 2', 'f(a)', 'a +', 'a.matrix', 'x + a'):
+                expect(lambda: Component.evaluate(expression, a=self.a)).to(raise_error(ValueError))
+            other = Component(date(2020, 11, 1), storage='numpy')
+            expect(lambda: Component.evaluate('a + b', a=self.a, b=other)).to(raise_error(ValueError))
+            expect(lambda: Component.evaluate('1 + k', k=2)).to(raise_error(ValueError))
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+from liquicomun import Component, Perdidas, Prmdiari, PriceComposer
+from expects import expect, equal, be_none, be_true, raise_error
+from mamba import description, context, it, before, after
+from specs.fixtures import k_coeffs_files, liquicomun_zip, ree_file, setup_offline, teardown_offline
+
+import numpy as np
+
+
+def component(value, month=10, storage='numpy'):
+    c = Component(date(2020, month, 1), storage=storage)
+    num_days = c.num_days
+    c.load([[value] * 25] * num_days)
+    return c
+
+
+with description('Price composition'):
+    with context('composing the prices of many tariffs'):
+        with it('must compute energy x (1 + losses / 100) + adjustments'):
+            composer = PriceComposer([component(40.0), component(2.0, storage='list')], [component(1.0), 0.5])
+            losses = np.stack([np.full((31, 25), 10.0), np.full((31, 25), 5.0)])
+
+            prices = composer.compose(losses)
+
+            expect(len(prices)).to(equal(2))
+            expect(prices[0].get(1, 0)).to(equal(42.0 * 1.1 + 1.5))
+            expect(prices[1].get(31, 24)).to(equal(42.0 * 1.05 + 1.5))
+            expect(prices[0].storage).to(equal('numpy'))
+
+        with it('must match the component operations'):
+            energy = component(40.0)
+            energy.set(3, 4, 55.5)
+            loss = component(12.3)
+            loss.set(3, 4, 7.7)
+            fee = component(0.25)
+
+            expected = energy * (1 + loss / 100) + fee
+            price = PriceComposer([energy], [fee]).compose([loss])[0]
+
+            expect(np.allclose(price.matrix, expected.matrix)).to(be_true)
+
+        with it('must return None for the not available losses'):
+            composer = PriceComposer([component(40.0)])
+            prices = composer.compose([component(10.0), None])
+            expect(prices[1]).to(be_none)
+            expect(prices[0].total_sum).to(equal(44.0 * 31 * 25))
+
+        with it('must refuse components or losses of different months'):
+            expect(lambda: PriceComposer([component(1.0), component(1.0, month=11)])).to(raise_error(ValueError))
+            expect(lambda: PriceComposer([1.0])).to(raise_error(ValueError))
+            composer = PriceComposer([component(40.0)])
+            expect(lambda: composer.compose(np.zeros((2, 30, 25)))).to(raise_error(ValueError))
+
+    with context('composing fetched prices and losses'):
+        with before.each:
+            files = dict(k_coeffs_files(31), prmdiari=ree_file('prmdiari', 31, 40.0))
+            setup_offline(self, [liquicomun_zip('A3', '20201001', '20201031', [], files)])
+
+        with after.each:
+            teardown_offline(self)
+
+        with it('must compose the batch of k_coeffs losses'):
+            params = {'date_start': '20201001', 'date_end': '20201031'}
+            losses, stacked = Perdidas(
+                tariffs=['2.0TD', '3.0TD'], subsystems=['peninsula'], type_import='k_coeffs', **params
+            ).batch()
+
+            prices = PriceComposer([Prmdiari(**params)]).compose(stacked)
+
+            for price, loss in zip(prices, losses):
+                expected = Prmdiari(**params) * (1 + loss / 100)
+                expect(np.allclose(price.matrix, expected.as_array())).to(be_true)
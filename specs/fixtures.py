@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Offline liquicomun fixtures shared by the specs and the benchmarks
+"""
+from datetime import date
+from io import BytesIO
+from liquicomun.datetime.season import year_calendar
+from liquicomun.formats import archive, REEformat
+from liquicomun.formats.perdidas import (
+    REE_perd_name, REE_subsystems_name, tariff_to_REEtariff, tariff_to_REEtariff_using_coeffs
+)
+from liquicomun.formats.ree import LOSS_COEFF_BOE
+
+import calendar
+import random
+import shutil
+import tempfile
+import time
+import zipfile
+
+VERSION_ROW = '2021;12;15;12;30;00;'
+PRM_FILES = ('prmdiari', 'prmncur', 'prgpncur', 'prdemcad')
+
+
+def ree_file(header, num_days, value):
+    lines = ['{};'.format(header), '2020;11;15;12;30;00;']
+    for day in range(1, num_days + 1):
+        values = ['{:.1f}'.format(value + hour * 0.1) for hour in range(0, 24)] + ['']
+        lines.append('{:02d}/10/2020;{};'.format(day, ';'.join(values)))
+    lines.append('*')
+    return '\n'.join(lines) + '\n'
+
+
+def periods_file(header, num_days, periods):
+    """ Periods table cycling the passed periods hour by hour """
+    lines = ['{};'.format(header), '2020;11;15;12;30;00;']
+    for day in range(1, num_days + 1):
+        values = [periods[(day + hour) % len(periods)] for hour in range(0, 24)] + ['']
+        lines.append('{:02d}/10/2020;{};'.format(day, ';'.join(values)))
+    lines.append('*')
+    return '\n'.join(lines) + '\n'
+
+
+def hourly_file(header, num_days, value, hours=None):
+    """
+    Hourly format of October 2020: 'Factor de potencia' -0.5 on odd hours and 0.3 on even
+    ones, 'Coste Total' value + hour * 0.1
+
+    :param hours: {day: hours of the day}, 24 by default
+    """
+    lines = ['{};'.format(header), '2020;11;15;12;30;00;']
+    for day in range(1, num_days + 1):
+        for hour in range(1, (hours or {}).get(day, 24) + 1):
+            values = ['1.0'] * 10 + [hour % 2 and '-0.5' or '0.3', '{:.1f}'.format(value + hour * 0.1), '']
+            lines.append('202010 {:02d} {:02d};{};'.format(day, hour, ';'.join(values)))
+    lines.append('*')
+    return '\n'.join(lines) + '\n'
+
+
+def liquicomun_zip(version, start, end, tariffs, files=None):
+    """
+    :param tariffs: perd files to include
+    :param files: {file_tmpl: content} of other files to include
+    """
+    num_days = calendar.monthrange(int(start[:4]), int(start[4:6]))[1]
+    data = BytesIO()
+    with zipfile.ZipFile(data, 'w') as zf:
+        for pos, tariff in enumerate(tariffs):
+            name = 'perd{}'.format(tariff)
+            zf.writestr('{}_{}_{}_{}'.format(version, name, start, end), ree_file(name, num_days, pos + 1))
+        for name, content in (files or {}).items():
+            zf.writestr('{}_{}_{}_{}'.format(version, name, start, end), content)
+    return data.getvalue()
+
+
+def k_coeffs_files(num_days):
+    """ Kreal and period tables of some tariffs """
+    return {
+        'Kreal': ree_file('Kreal', num_days, 1.0),
+        'petar20TD': periods_file('petar20TD', num_days, ['1', '2', '3']),
+        'petar30TD': periods_file('petar30TD', num_days, ['1', '2', '3', '4', '5', '6', '']),
+        'pertarif': periods_file('pertarif', num_days, ['1', '6']),
+    }
+
+
+def period_of(month):
+    """ 'YYYYMM' -> ('YYYYMMDD', 'YYYYMMDD') """
+    year, month = int(month[:4]), int(month[4:])
+    return '{:04d}{:02d}01'.format(year, month), '{:04d}{:02d}{:02d}'.format(
+        year, month, calendar.monthrange(year, month)[1]
+    )
+
+
+def month_days(month):
+    """ [(date, hours of the day)] of 'YYYYMM' """
+    year, month = int(month[:4]), int(month[4:])
+    hours = year_calendar(year).month_hours(month)
+    return [(date(year, month, day + 1), int(hours[day])) for day in range(len(hours))]
+
+
+def month_daily_file(header, month, value, fmt='{:.1f}'):
+    """
+    REE daily format of any month, with the 23 and 25 hour days of DST
+
+    :param value: function(random, hour) that returns the value of the hour
+    """
+    rnd = random.Random(header + month)
+    lines = ['{};'.format(header), VERSION_ROW]
+    for day, hours in month_days(month):
+        values = [fmt.format(value(rnd, hour)) for hour in range(hours)] + [''] * (25 - hours)
+        lines.append('{};{};'.format(day.strftime('%d/%m/%Y'), ';'.join(values)))
+    lines.append('*')
+    return '\n'.join(lines) + '\n'
+
+
+def month_hourly_file(header, month):
+    """ grcosdnc format of any month: one row of 15 fields (date, 13 values and an empty one) per hour """
+    rnd = random.Random(header + month)
+    lines = ['{};'.format(header), VERSION_ROW]
+    for day, hours in month_days(month):
+        for hour in range(1, hours + 1):
+            values = ['{:.2f}'.format(rnd.uniform(-1, 5)) for _ in range(13)]
+            lines.append('{} {:02d} {:02d};{};'.format(day.strftime('%Y%m'), day.day, hour, ';'.join(values)))
+    lines.append('*')
+    return '\n'.join(lines) + '\n'
+
+
+def periods_table(tariff):
+    """ Name of the k_coeffs periods table of the tariff, as Perdida looks for it """
+    if tariff.startswith('g'):
+        return 'pertarif'
+    if 'DH' in tariff:
+        return 'peta' + tariff
+    return 'petar' + tariff
+
+
+def grid_files(month):
+    """ {file_tmpl: content} of all the files of a Perdidas grid """
+    files = {}
+    perd_tariffs = sorted(set(tariff_to_REEtariff.values()))
+    for subsystem, subsystem_REE in REE_subsystems_name.items():
+        for tariff in perd_tariffs:
+            name = REE_perd_name(subsystem) + tariff + (subsystem_REE and '_' + subsystem_REE)
+            files[name] = month_daily_file(name, month, lambda rnd, hour: rnd.uniform(1, 20))
+
+    files['Kreal'] = month_daily_file('Kreal', month, lambda rnd, hour: rnd.uniform(0.8, 1.2))
+    for tariff in sorted(set(tariff_to_REEtariff_using_coeffs.values())):
+        table = periods_table(tariff)
+        if table in files:
+            continue
+        periods = sorted(LOSS_COEFF_BOE[tariff], key=int)
+        files[table] = month_daily_file(table, month, lambda rnd, hour: periods[hour * len(periods) // 25], '{}')
+
+    for name in PRM_FILES:
+        files[name] = month_daily_file(name, month, lambda rnd, hour: rnd.uniform(30, 90))
+    files['grcosdnc'] = month_hourly_file('grcosdnc', month)
+    return files
+
+
+def grid_zip(month, version='A3'):
+    """ Liquicomun archive of the month with all the files of a Perdidas grid """
+    start, end = period_of(month)
+    data = BytesIO()
+    with zipfile.ZipFile(data, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, content in sorted(grid_files(month).items()):
+            zf.writestr('{}_{}_{}_{}'.format(version, name, start, end), content)
+    return data.getvalue()
+
+
+class FakeLiquicomun(object):
+    def __init__(self, archives, calls, latency=0.0):
+        self.archives = archives
+        self.calls = calls
+        self.latency = latency
+
+    def download(self, start_date, end_date, next=0):
+        if self.latency:
+            time.sleep(self.latency)
+        self.calls.append(next)
+        archives = self.archives
+        if isinstance(archives, dict):
+            archives = archives.get(start_date.strftime('%Y%m'), [])
+        assert next < len(archives), 'The desired version is not available'
+        return archives[next]
+
+
+class FakeEsios(object):
+    # [archive of next=0, archive of next=1, ...] or {'YYYYMM': [...]} by month
+    archives = []
+    calls = []
+    # seconds slept by every download
+    latency = 0.0
+
+    def __init__(self, token):
+        self.token = token
+
+    def liquicomun(self):
+        return FakeLiquicomun(self.archives, self.calls, self.latency)
+
+
+def setup_offline(context, archives):
+    """
+    Serves the archives through FakeEsios using an empty cache directory
+    """
+    context.cache_dir = tempfile.mkdtemp()
+    context.original = (archive.Esios, REEformat._CACHE_DIR, REEformat.token)
+    archive.Esios = FakeEsios
+    FakeEsios.archives = archives
+    FakeEsios.calls = []
+    REEformat.set_cache_dir(context.cache_dir)
+    REEformat.token = 'token'
+
+
+def teardown_offline(context):
+    archive.Esios, cache_dir, REEformat.token = context.original
+    REEformat.set_cache_dir(cache_dir)
+    shutil.rmtree(context.cache_dir)
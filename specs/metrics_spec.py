@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from liquicomun import Perdida, Perdidas
+from liquicomun.metrics import Metrics, REGISTRY, collecting, count, timer
+from expects import expect, equal, contain, be_above, have_key
+from mamba import description, context, it, before, after
+from specs.fixtures import liquicomun_zip, setup_offline, teardown_offline
+
+import copy
+import json
+import pickle
+
+
+with description('Metrics'):
+    with it('must record counters and timings in the collecting registries'):
+        metrics = Metrics()
+        events = []
+        metrics.add_hook(lambda kind, name, value: events.append((kind, name)))
+        with collecting(metrics):
+            count('downloads')
+            count('downloads', 2)
+            with timer('parse'):
+                pass
+        count('downloads')
+
+        data = metrics.as_dict()
+        expect(data['counters']).to(equal({'downloads': 3}))
+        expect(data['timings']['parse']['count']).to(equal(1))
+        expect(events).to(equal([('counter', 'downloads'), ('counter', 'downloads'), ('timing', 'parse')]))
+        expect(json.loads(metrics.to_json())['counters']['downloads']).to(equal(3))
+        expect(metrics.to_prometheus()).to(contain('liquicomun_downloads_total 3\n'))
+        expect(metrics.to_prometheus()).to(contain('liquicomun_parse_seconds_count 1\n'))
+
+    with context('fetching losses'):
+        with before.each:
+            setup_offline(self, [liquicomun_zip('A3', '20201001', '20201031', ['20A', '30A'])])
+            REGISTRY.reset()
+
+        with after.each:
+            teardown_offline(self)
+
+        with it('must record the stages of every loss and of the Perdidas run'):
+            params = {'date_start': '20201001', 'date_end': '20201031', 'type_import': 'perd_files'}
+            cold = Perdida(tariff='2.0A', **params)
+            warm = Perdida(tariff='2.0A', **params)
+
+            expect(cold.metrics.counters).to(equal({'cache_misses': 1, 'probes': 1, 'downloads': 1}))
+            for stage in ('probe', 'download', 'unzip', 'validation', 'parse'):
+                expect(cold.metrics.timings).to(have_key(stage))
+            expect(warm.metrics.counters).to(equal({'cache_hits': 1, 'snapshot_hits': 1}))
+            expect(REGISTRY.counters['cache_hits']).to(equal(1))
+
+            losses = Perdidas(tariffs=['2.0A', '3.0A'], subsystems=['peninsula'], lazy=True, **params)
+            fetched = list(losses)
+            fetched[1].resolve()
+
+            expect(losses.metrics.counters).to(equal({'cache_hits': 1}))
+            expect(losses.metrics.timings['parse'][0]).to(be_above(0))
+
+        with it('must pickle and copy the loaded components with their metrics'):
+            params = {'date_start': '20201001', 'date_end': '20201031', 'type_import': 'perd_files'}
+            loss = Perdida(tariff='2.0A', **params)
+            loss.metrics.add_hook(lambda kind, name, value: None)
+
+            for copied in (pickle.loads(pickle.dumps(loss)), copy.deepcopy(loss)):
+                expect(copied.matrix).to(equal(loss.matrix))
+                expect(copied.file_version).to(equal('A3'))
+                expect(copied.metrics.counters).to(equal(loss.metrics.counters))
+                expect(copied.metrics.hooks).to(equal([]))
+                copied.metrics.count('downloads')
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+from io import StringIO
+from liquicomun import Perdida, Perdidas
+from liquicomun.formats import ree
+from liquicomun.formats import REEformat
+from liquicomun.formats.parser import REEReader
+from liquicomun.formats.ree import LOSS_COEFF_BOE, round_values
+from expects import expect, equal, raise_error
+from mamba import description, context, it, before, after
+from specs.fixtures import (
+    k_coeffs_files, liquicomun_zip, ree_file, setup_offline, teardown_offline
+)
+
+import csv
+import numpy as np
+
+
+with description('REE streaming parser'):
+    with it('must read the version and the days into the buffer'):
+        reader = REEReader(StringIO(ree_file('perd20A', 31, 1.0)), 'perd20A')
+        matrix = reader.read_into(np.zeros((31, 25)), 31)
+
+        expect(reader.version).to(equal('20201115123000'))
+        expect(matrix[0][:3].tolist()).to(equal([1.0, 1.1, 1.2]))
+        expect(matrix[30][24]).to(equal(0.0))
+
+    with it('must validate the header'):
+        expect(lambda: REEReader(StringIO(ree_file('perd20A', 31, 1.0)), 'Kreal')).to(raise_error(ValueError))
+        expect(lambda: REEReader(StringIO(''), 'Kreal')).to(raise_error(ValueError, 'Empty File'))
+
+    with it('must validate the day count'):
+        reader = REEReader(StringIO(ree_file('perd20A', 30, 1.0)), 'perd20A')
+        expect(lambda: reader.read_into(np.zeros((31, 25)), 31)).to(raise_error(ValueError))
+        reader = REEReader(StringIO(ree_file('perd20A', 31, 1.0)), 'perd20A')
+        expect(lambda: reader.read_into(np.zeros((30, 25)), 30)).to(raise_error(ValueError))
+
+    with it('must validate the footer'):
+        content = ree_file('perd20A', 31, 1.0).replace('*\n', '')
+        reader = REEReader(StringIO(content), 'perd20A')
+        expect(lambda: reader.read_into(np.zeros((31, 25)), 31)).to(raise_error(ValueError))
+
+    with context('loading k coefficients'):
+        with before.each:
+            setup_offline(self, [liquicomun_zip('A3', '20201001', '20201031', [], k_coeffs_files(31))])
+
+        with after.each:
+            teardown_offline(self)
+
+        with it('must compute the losses with the BOE coefficients'):
+            files = k_coeffs_files(31)
+            rows = list(csv.reader(StringIO(files['Kreal']), delimiter=';'))
+            for tariff, table in (('20TD', 'petar20TD'), ('30TD', 'petar30TD'), ('g61A', 'pertarif')):
+                periodstable = list(csv.reader(StringIO(files[table]), delimiter=';'))
+                loss = Perdida(
+                    tariff=tariff, date_start='20201001', date_end='20201031', type_import='k_coeffs'
+                )
+                expected = [
+                    [
+                        round(period and k and float(k) * LOSS_COEFF_BOE[tariff][period] or 0.0, 1) or 0.0
+                        for k, period in zip(row[1:26], periods[1:26])
+                    ]
+                    for row, periods in zip(rows[2:-1], periodstable[2:-1])
+                ]
+
+                expect(loss.file_version).to(equal('A3'))
+                expect(loss.matrix).to(equal(expected))
+
+        with it('must parse every file once for a batch of tariffs'):
+            parsed = []
+
+            class CountingReader(REEReader):
+                def __init__(self, stream, name, check_name=True):
+                    super(CountingReader, self).__init__(stream, name, check_name)
+                    parsed.append(name)
+
+            ree.REEReader = CountingReader
+            try:
+                losses, stacked = Perdida.batch(
+                    ['20TD', '30TD', 'g61A', 'g62'], '20201001', '20201031', storage='numpy'
+                )
+            finally:
+                ree.REEReader = REEReader
+
+            expect(len(parsed)).to(equal(4))
+            expect(stacked.shape).to(equal((4, 31, 25)))
+            for position, tariff in enumerate(['20TD', '30TD', 'g61A', 'g62']):
+                expect(losses[position].tariff).to(equal(tariff))
+                expect(stacked[position].tolist()).to(equal(Perdida(
+                    tariff=tariff, date_start='20201001', date_end='20201031', type_import='k_coeffs'
+                ).matrix))
+
+        with it('must stack the losses of all the tariffs'):
+            losses = Perdidas(
+                date_start='20201001', date_end='20201031', tariffs=['2.0TD', '3.0TD', '6.1TD'],
+                type_import='k_coeffs',
+            )
+            result, stacked = losses.batch()
+
+            expect(result[2]).to(equal(None))
+            expect(stacked[0].tolist()).to(equal(result[0].matrix))
+            expect(bool(np.isnan(stacked[2]).all())).to(equal(True))
+
+        with it('must reject periods without coefficient'):
+            loss = REEformat.__new__(REEformat)
+            expect(
+                lambda: loss.losses_using_coeffs(np.ones((1, 25)), np.full((1, 25), 3), '20A')
+            ).to(raise_error(ValueError))
+
+    with it('must round as python round'):
+        values = np.concatenate([
+            np.arange(-2000, 2000) / 40.0,
+            np.arange(-2000, 2000) * 0.05 * 16.7,
+            np.random.RandomState(1).uniform(-100, 100, 10000),
+        ])
+        expected = [round(value, 1) or 0.0 for value in values.tolist()]
+        rounded = round_values(values, 1)
+
+        expect(rounded.tolist()).to(equal(expected))
+        expect(bool(np.signbit(rounded[rounded == 0]).any())).to(equal(False))
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from io import StringIO
+from liquicomun import Grcosdnc, Prmdiari, Prmncur, Prgpncur
+from liquicomun.formats.parser import REEHourlyReader
+from expects import expect, equal, be_false, be_true, raise_error
+from mamba import description, context, it, before, after
+from specs.fixtures import (
+    FakeEsios, hourly_file, liquicomun_zip, ree_file, setup_offline, teardown_offline
+)
+
+import numpy as np
+
+
+with description('Prices'):
+    with before.each:
+        files = {
+            'grcosdnc': hourly_file('grcosdnc', 31, 2.0, hours={25: 25}),
+            'prmdiari': ree_file('prmdiari', 31, 40.0),
+            'prmncur': ree_file('prmncur', 31, 50.0),
+            'prgpncur': ree_file('prgpncur', 31, 0.5),
+        }
+        setup_offline(self, [liquicomun_zip('A3', '20201001', '20201031', [], files)])
+        self.params = {'date_start': '20201001', 'date_end': '20201031'}
+
+    with after.each:
+        teardown_offline(self)
+
+    with context('the daily prices'):
+        with it('must be fetched as the losses'):
+            prices = [cls(**self.params) for cls in (Prmdiari, Prmncur, Prgpncur)]
+
+            expect(FakeEsios.calls).to(equal([0]))
+            expect([price.file_version for price in prices]).to(equal(['A3', 'A3', 'A3']))
+            expect([price.get(2, 1) for price in prices]).to(equal([40.1, 50.1, 0.6]))
+            expect(prices[0].date_end).to(equal('20201031'))
+
+        with it('must be served from the cache the next time'):
+            Prmdiari(**self.params)
+            price = Prmdiari(storage='numpy', **self.params)
+
+            expect(FakeEsios.calls).to(equal([0]))
+            expect(price.origin).to(equal('cache'))
+            expect(price.matrix.shape).to(equal((31, 25)))
+
+        with it('must be lazy and accept a client'):
+            price = Prmncur(lazy=True, client=FakeEsios('another token'), **self.params)
+            expect(price.loaded).to(be_false)
+            expect(price.get(1, 0)).to(equal(50.0))
+            expect(price.loaded).to(be_true)
+
+    with context('the hourly grcosdnc'):
+        with it('must add the negative power factor to the total'):
+            price = Grcosdnc(**self.params)
+
+            expect(price.get(1, 0)).to(equal(2.1 + 0.5))
+            expect(price.get(1, 1)).to(equal(2.2))
+            expect(price.get(1, 24)).to(equal(0.0))
+            expect(price.get(25, 24)).to(equal(2.0 + 2.5 + 0.5))
+            expect(price.file_version).to(equal('A3'))
+
+        with it('must keep the vectorized value compatible'):
+            price = Grcosdnc(**self.params)
+            expect(float(price._get_value(-0.5, 2.0))).to(equal(2.5))
+            expect(float(price._get_value(0.3, 2.0))).to(equal(2.0))
+            expect(price._get_value(np.array([-1.0, 1.0]), np.array([1.0, 1.0])).tolist()).to(equal([2.0, 1.0]))
+
+        with it('must load the hours of the stream'):
+            price = Grcosdnc(**self.params)
+            price.loadstream(StringIO(hourly_file('grcosdnc', 31, 1.0)))
+
+            expect(price.get(1, 0)).to(equal(1.1 + 0.5))
+            expect(price.get(25, 24)).to(equal(0.0))
+            expect(price.version).to(equal('20201115123000'))
+
+        with it('must refuse a bad hourly file'):
+            content = hourly_file('grcosdnc', 31, 2.0)
+            reader = REEHourlyReader(StringIO(content.replace('\n*\n', '\n')), 'grcosdnc', 15)
+            expect(lambda: reader.read_columns((11, 12))).to(raise_error(ValueError))
+            reader = REEHourlyReader(StringIO(content.replace(';1.0;', ';', 1)), 'grcosdnc', 15)
+            expect(lambda: reader.read_columns((11, 12))).to(raise_error(ValueError))
+            reader = REEHourlyReader(StringIO(content.replace('202010 01 01', '202010 01 xx')), 'grcosdnc', 15)
+            expect(lambda: reader.read_columns((11, 12))).to(raise_error(ValueError))
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+from io import BytesIO
+from liquicomun import Perdida, Perdidas, Prmdiari, refresh_versions
+from expects import expect, equal, be_false, be_true
+from mamba import description, context, it, before, after
+from specs.fixtures import (
+    FakeEsios, FakeLiquicomun, k_coeffs_files, liquicomun_zip, ree_file, periods_file, setup_offline, teardown_offline
+)
+
+import zipfile
+
+
+class FakeListingClient(FakeEsios):
+    """ Lists the archives as EsiosClient does """
+
+    def liquicomun(self):
+        return FakeLiquicomun(FakeEsios.archives, FakeEsios.calls)
+
+    def archives(self, start_date, end_date):
+        return [
+            {'name': '{}_liquicomun'.format(zipfile.ZipFile(BytesIO(archive)).namelist()[0][:2])}
+            for archive in FakeEsios.archives
+        ]
+
+
+def estimated_files(num_days):
+    return {
+        'Kestimado': ree_file('Kestimado', num_days, 2.0),
+        'petar20TD': periods_file('petar20TD', num_days, ['1', '2', '3']),
+    }
+
+
+with description('Incremental version refresh'):
+    with before.each:
+        old_files = dict(estimated_files(31), prmdiari=ree_file('prmdiari', 31, 40.0))
+        new_files = dict(k_coeffs_files(31), prmdiari=ree_file('prmdiari', 31, 45.0))
+        self.old = liquicomun_zip('A1', '20201001', '20201031', ['20A', '30A'], old_files)
+        self.new = liquicomun_zip('A3', '20201001', '20201031', ['30A', '20A'], new_files)
+        setup_offline(self, [self.old])
+        self.params = {'date_start': '20201001', 'date_end': '20201031', 'type_import': 'perd_files'}
+
+    with after.each:
+        teardown_offline(self)
+
+    with context('a newer version is published'):
+        with it('must reload just the outdated components downloading once'):
+            losses = [Perdida(tariff=tariff, **self.params) for tariff in ['2.0A', '3.0A']]
+            price = Prmdiari(date_start='20201001', date_end='20201031')
+            FakeEsios.archives = [self.new, self.old]
+            FakeEsios.calls = []
+
+            changes = refresh_versions(losses + [price, None], max_age=0)
+
+            expect(FakeEsios.calls).to(equal([0]))
+            expect([(change.component, change.old_version, change.new_version) for change in changes]).to(equal([
+                (losses[0], 'A1', 'A3'), (losses[1], 'A1', 'A3'), (price, 'A1', 'A3'),
+            ]))
+            expect([loss.get(1, 0) for loss in losses]).to(equal([2.0, 1.0]))
+            expect(price.get(1, 0)).to(equal(45.0))
+
+        with it('must not download again on the next refreshes'):
+            losses = [Perdida(tariff=tariff, **self.params) for tariff in ['2.0A', '3.0A']]
+            FakeEsios.archives = [self.new, self.old]
+            refresh_versions(losses, max_age=0)
+            FakeEsios.calls = []
+
+            expect(refresh_versions(losses)).to(equal([]))
+            expect(FakeEsios.calls).to(equal([]))
+
+        with it('must skip the components of the final version'):
+            FakeEsios.archives = [liquicomun_zip('C7', '20201001', '20201031', ['20A'])]
+            loss = Perdida(tariff='2.0A', **self.params)
+            FakeEsios.calls = []
+
+            for _ in range(3):
+                expect(refresh_versions([loss], max_age=0)).to(equal([]))
+            expect(FakeEsios.calls).to(equal([]))
+
+        with it('must find the new version for the next loads'):
+            loss = Perdida(tariff='2.0A', **self.params)
+            FakeEsios.archives = [self.new, self.old]
+            refresh_versions([loss], max_age=0)
+            FakeEsios.calls = []
+
+            expect(Perdida(tariff='3.0A', **self.params).file_version).to(equal('A3'))
+            expect(FakeEsios.calls).to(equal([]))
+
+        with it('must move the estimated k_coeffs losses to the real ones'):
+            params = dict(self.params, type_import='k_coeffs')
+            loss = Perdida(tariff='2.0TD', **params)
+            expect(loss.name).to(equal('Kestimado'))
+            FakeEsios.archives = [self.new, self.old]
+
+            changes = refresh_versions([loss], max_age=0)
+
+            expect([change.new_version for change in changes]).to(equal(['A3']))
+            expect(loss.name).to(equal('Kreal'))
+            expect(loss.file_version).to(equal('A3'))
+
+        with it('must refresh the lazy losses and the months of a series'):
+            lazy = Perdida(tariff='2.0A', lazy=True, **self.params)
+            FakeEsios.archives = {'202010': [self.old]}
+            series = Perdidas(
+                date_start='20200901', date_end='20201031', tariffs=['3.0A'], subsystems=['peninsula'],
+                type_import='perd_files'
+            ).fetch('peninsula', '3.0A')
+            FakeEsios.archives = {'202010': [self.new, self.old]}
+
+            changes = refresh_versions([lazy, series], max_age=0)
+
+            expect(len(changes)).to(equal(2))
+            expect(lazy.loaded).to(be_false)
+            expect(lazy.file_version).to(equal('A3'))
+            expect(lazy.get(1, 0)).to(equal(2.0))
+            expect(series.versions).to(equal([None, 'A3']))
+
+    with context('no newer version is published'):
+        with it('must not reload anything'):
+            loss = Perdida(tariff='2.0A', **self.params)
+            before_matrix = loss.matrix
+
+            expect(refresh_versions([loss])).to(equal([]))
+            expect(loss.matrix is before_matrix).to(be_true)
+
+        with it('must just list the archives with a listing client'):
+            client = FakeListingClient('token')
+            loss = Perdida(tariff='2.0A', client=client, **self.params)
+            FakeEsios.calls = []
+
+            expect(refresh_versions([loss])).to(equal([]))
+            expect(FakeEsios.calls).to(equal([]))
+
+            FakeEsios.archives = [self.new, self.old]
+            changes = refresh_versions([loss])
+            expect(FakeEsios.calls).to(equal([0]))
+            expect([change.new_version for change in changes]).to(equal(['A3']))
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from datetime import date, datetime, timedelta
+from liquicomun.datetime.season import get_season, get_seasons, is_summer, last_sunday, year_calendar
+from liquicomun.datetime.timezone import TIMEZONE
+from liquicomun.formats.component import Component
+from expects import expect, equal, be
+from mamba import description, it
+
+import numpy as np
+import pytz
+
+
+with description('Calendar index'):
+    with it('must find the last sunday of the month'):
+        expect(last_sunday(2020, 3)).to(equal(29))
+        expect(last_sunday(2020, 10)).to(equal(25))
+        expect(last_sunday(2021, 10)).to(equal(31))
+
+    with it('must index the hours of every day'):
+        calendar = year_calendar(2021)
+
+        expect(calendar.dst_days).to(equal({3: 28, 10: 31}))
+        expect(calendar.month_hours(3)[27]).to(equal(23))
+        expect(calendar.month_hours(10)[30]).to(equal(25))
+        expect(int(calendar.hours.sum())).to(equal(8760))
+        expect(year_calendar(2021)).to(be(calendar))
+
+    with it('must index the season of every hourly slot'):
+        summer = year_calendar(2021).month_summer(10)
+
+        expect(summer[30][:4].tolist()).to(equal([True, True, True, False]))
+        expect(bool(summer[29][:24].all())).to(equal(True))
+        expect(bool(summer[29][24])).to(equal(False))
+        expect(year_calendar(2021).month_summer(3)[27][:4].tolist()).to(equal([False, False, True, True]))
+
+    with it('must compute the same seasons as get_season'):
+        local = [datetime(2019, 3, 1) + timedelta(minutes=30 * i) for i in range(2 * 24 * 300)]
+        expect(get_seasons(local).tolist()).to(equal([get_season(dt) for dt in local]))
+
+        utc = np.datetime64('2019-03-30T20:00:00') + np.arange(0, 3600 * 24 * 220, 900).astype('timedelta64[s]')
+        expected = [
+            bool(pytz.utc.localize(dt).astimezone(TIMEZONE).dst()) for dt in utc.astype(datetime).tolist()
+        ]
+        expect(is_summer(utc, utc=True).tolist()).to(equal(expected))
+
+    with it('must drop the missing hour from the audit data'):
+        component = Component(date(2021, 3, 1))
+        audit_data = component.get_audit_data(start=28, end=28)
+
+        expect(len(audit_data)).to(equal(23))
+        expect(audit_data[-1][0]).to(equal('2021-03-28 23'))
+        expect(len(Component(date(2021, 10, 1)).get_audit_data(start=31, end=31))).to(equal(25))
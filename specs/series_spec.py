@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+from io import StringIO
+from liquicomun import Perdidas, PerdidaSeries, month_ranges, write_audit
+from expects import expect, equal, be_none, be_true, be_below_or_equal, raise_error
+from mamba import description, context, it, before, after
+from specs.fixtures import FakeEsios, liquicomun_zip, k_coeffs_files, setup_offline, teardown_offline
+
+import numpy as np
+import threading
+
+
+with description('Losses of many months'):
+    with before.each:
+        setup_offline(self, {
+            '202010': [liquicomun_zip('A3', '20201001', '20201031', ['20A', '30A'], k_coeffs_files(31))],
+            '202011': [liquicomun_zip('A1', '20201101', '20201130', ['20A', '30A'], k_coeffs_files(30))],
+        })
+        self.params = {'tariffs': ['2.0A', '3.0A'], 'subsystems': ['peninsula'], 'type_import': 'perd_files'}
+
+    with after.each:
+        teardown_offline(self)
+
+    with context('splitting the range'):
+        with it('must return every month across years'):
+            expect(month_ranges('20201215', '20210210')).to(equal([
+                ('20201201', '20201231'), ('20210101', '20210131'), ('20210201', '20210228'),
+            ]))
+            expect(month_ranges('20201001', '20201031')).to(equal([('20201001', '20201031')]))
+
+    with context('fetching a range of many months'):
+        with it('must return a series of every month'):
+            losses = list(Perdidas(date_start='20201015', date_end='20201110', **self.params))
+
+            expect([isinstance(loss, PerdidaSeries) for loss in losses]).to(equal([True, True]))
+            expect(losses[0].versions).to(equal(['A3', 'A1']))
+            expect(losses[0].missing).to(equal([]))
+            expect(losses[0].num_days).to(equal(17 + 10))
+            expect(losses[0].as_array()[0, 0]).to(equal(1.0))
+            expect(losses[1].as_array()[-1, 23]).to(equal(2.0 + 2.3))
+
+        with it('must concatenate the real hours of every day'):
+            series = Perdidas(date_start='20201024', date_end='20201101', **self.params).fetch('peninsula', '2.0A')
+            hourly = series.hourly()
+
+            # 25 hours the 25th of October
+            expect(len(hourly.values)).to(equal(9 * 24 + 1))
+            expect(str(hourly.dates[24])).to(equal('2020-10-25'))
+            expect(str(hourly.dates[24 + 25])).to(equal('2020-10-26'))
+            expect(hourly.hours[24:24 + 25].tolist()).to(equal(list(range(1, 26))))
+            expect(str(hourly.dates[-1])).to(equal('2020-11-01'))
+            expect(hourly.values[-1]).to(equal(1.0 + 2.3))
+
+        with it('must fill the not available months with NaN'):
+            series = Perdidas(date_start='20200930', date_end='20201001', **self.params).fetch('peninsula', '2.0A')
+
+            expect(series.missing).to(equal(['202009']))
+            expect(bool(np.isnan(series.as_array()[0]).all())).to(be_true)
+            expect(series.total_sum).to(equal(float(np.nansum(series.as_array()[1, :24]))))
+
+        with it('must return None if no month is available'):
+            losses = Perdidas(date_start='20200801', date_end='20200930', **self.params)
+            expect(losses.fetch('peninsula', '2.0A')).to(be_none)
+
+        with it('must fetch every month concurrently with the losses workers'):
+            losses = Perdidas(date_start='20201001', date_end='20201130', workers=2, **self.params)
+            fetched = losses.fetch_all()
+
+            expect([loss.versions for loss in fetched]).to(equal([['A3', 'A1'], ['A3', 'A1']]))
+            expect(FakeEsios.calls.count(0)).to(equal(2))
+
+        with it('must not use more threads than the losses workers'):
+            losses = Perdidas(date_start='20201001', date_end='20201130', workers=2, **self.params)
+            fetch_month = losses._fetch_month
+            threads = set()
+
+            def tracked(*args):
+                threads.add(threading.current_thread().ident)
+                return fetch_month(*args)
+            losses._fetch_month = tracked
+            fetched = losses.fetch_all()
+
+            expect(len(threads)).to(be_below_or_equal(2))
+            expect([loss.versions for loss in fetched]).to(equal([['A3', 'A1'], ['A3', 'A1']]))
+
+        with it('must compute the k_coeffs losses of every month'):
+            params = dict(self.params, tariffs=['2.0TD', '3.0TD'], type_import='k_coeffs')
+            losses, stacked = Perdidas(date_start='20201001', date_end='20201130', **params).batch()
+
+            expect(stacked.shape).to(equal((2, 61, 25)))
+            expect(losses[0].versions).to(equal(['A3', 'A1']))
+
+        with it('must resolve lazy losses on first use'):
+            losses = Perdidas(date_start='20201001', date_end='20201130', lazy=True, **self.params)
+            series = losses.fetch('peninsula', '3.0A')
+
+            expect(series.loaded).to(equal(False))
+            expect(series.as_array().shape).to(equal((61, 25)))
+            expect(series.loaded).to(be_true)
+
+        with it('must export the audit data of the range'):
+            series = Perdidas(date_start='20201031', date_end='20201101', **self.params).fetch('peninsula', '2.0A')
+            out = StringIO()
+
+            expect(write_audit(out, [series])).to(equal(48))
+            expect(out.getvalue().splitlines()[0]).to(equal('2020-10-31 01,1.0,A3,'))
+            expect(out.getvalue().splitlines()[-1]).to(equal('2020-11-01 24,3.3,A1,'))
+            expect(lambda: list(series.iter_audit_columns(start=1))).to(raise_error(ValueError))
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+from liquicomun import ComponentStore
+from liquicomun.formats.component import Component
+from expects import expect, equal, be_none, be_true
+from mamba import description, context, it, before, after
+
+import numpy as np
+import shutil
+import tempfile
+
+
+def month_component(year, month, value):
+    component = Component(date(year, month, 1), version='v{}'.format(value), storage='numpy')
+    component.matrix[:] = value
+    component.tariff = '30TD'
+    component.subsystem = 'baleares'
+    return component
+
+
+with description('Component store'):
+    with before.each:
+        self.directory = tempfile.mkdtemp()
+        self.store = ComponentStore(self.directory)
+
+    with after.each:
+        shutil.rmtree(self.directory)
+
+    with it('must pack the months in a single day indexed series'):
+        self.store.add(month_component(2021, 3, 3.0))
+        self.store.add(month_component(2021, 1, 1.0))
+        self.store.add(month_component(2021, 5, 5.0))
+
+        values = self.store.get('component', '30TD', 'baleares')
+        expect(values.shape).to(equal((31 + 28 + 31 + 30 + 31, 25)))
+        expect(values[0][0]).to(equal(1.0))
+        expect(bool(np.isnan(values[31][0]))).to(be_true)
+        expect(values[31 + 28][0]).to(equal(3.0))
+        expect(values[-1][24]).to(equal(5.0))
+        expect(self.store.keys()).to(equal([('component', '30TD', 'baleares')]))
+
+    with it('must return range slices of the mapping'):
+        self.store.add(month_component(2021, 1, 1.0))
+        self.store.add(month_component(2021, 2, 2.0))
+
+        values = self.store.get('component', '30TD', 'baleares', '20210130', date(2021, 2, 2))
+        dates = self.store.dates('component', '30TD', 'baleares', '20210130', date(2021, 2, 2))
+
+        expect(values[:, 0].tolist()).to(equal([1.0, 1.0, 2.0, 2.0]))
+        expect(isinstance(values, np.memmap)).to(be_true)
+        expect(str(dates[0])).to(equal('2021-01-30'))
+        expect(len(dates)).to(equal(4))
+        expect(self.store.get('component', '30TD', 'baleares', '20200101', '20201231').shape).to(equal((0, 25)))
+
+    with it('must rebuild the stored months as components'):
+        self.store.add(month_component(2021, 2, 2.0))
+        reopened = ComponentStore(self.directory)
+
+        component = reopened.component('component', '30TD', 'baleares', 2021, 2)
+        expect(component.version).to(equal('v2.0'))
+        expect(component.total_sum).to(equal(2.0 * 28 * 25))
+        expect(reopened.component('component', '30TD', 'baleares', 2021, 3)).to(be_none)
+
+    with it('must change the rebuilt components without changing the store'):
+        self.store.add(month_component(2021, 1, 1.0))
+        self.store.add(month_component(2021, 2, 2.0))
+
+        component = self.store.component('component', '30TD', 'baleares', 2021, 2)
+        expect(component.set(1, 0, 9.0)).to(be_true)
+        component *= 2
+        expect(component.get(1, 0)).to(equal(18.0))
+        expect(component.get(28, 24)).to(equal(4.0))
+
+        expect(self.store.get('component', '30TD', 'baleares')[31:, 0].tolist()).to(equal([2.0] * 28))
+        expect(self.store.component('component', '30TD', 'baleares', 2021, 2).get(1, 0)).to(equal(2.0))